@@ -1,15 +1,61 @@
-from flask import Flask, jsonify, request
+from flask import Flask, Response, jsonify, request, stream_with_context
 from flask_cors import CORS
+from werkzeug.http import http_date
 from config import Config
 from database import SupabaseDB
-import os
+from snapshot import SnapshotAliquotas, brotli
+from atualizacao import AgendadorAtualizacao, GerenciadorAtualizacao
+from calculos import (
+    MENSAGENS_ERRO,
+    VALOR_OPERACAO_MAXIMO,
+    calcular_difal_vetorizado,
+    converter_valores,
+    indices_ufs
+)
+from ufs import UFS
+import numpy as np
+import csv
+import io
+import json
+import math
+import threading
 from datetime import datetime
 
 app = Flask(__name__)
 CORS(app)
 
-# Inicializa banco
-db = SupabaseDB()
+# Cliente do banco criado sob demanda: importar este módulo não conecta ao Supabase
+_db = None
+_db_lock = threading.Lock()
+
+def obter_db():
+    """Retorna o cliente do banco, criando-o no primeiro uso"""
+    global _db
+    if _db is None:
+        with _db_lock:
+            if _db is None:
+                _db = SupabaseDB()
+    return _db
+
+def reconectar_db():
+    """Recria as conexões do cliente já existente (usado após o fork dos workers)"""
+    if _db is not None:
+        _db.reconectar()
+
+# Snapshot em memória: consultas não fazem round trip ao Supabase.
+# Aquece a partir do arquivo local; a carga do banco acontece na inicialização
+# do servidor ou no primeiro acesso.
+snapshot = SnapshotAliquotas(obter_db)
+snapshot.carregar_arquivo()
+
+# Atualizações (scraping + importação) rodam em segundo plano, uma por vez
+atualizacoes = GerenciadorAtualizacao(obter_db, snapshot)
+agendador = AgendadorAtualizacao(atualizacoes)
+
+def iniciar_agendador():
+    """Inicia o agendador de atualização, se configurado (chamado por processo servidor)"""
+    if Config.AGENDADOR_INTERVALO > 0:
+        agendador.iniciar()
 
 # ============================================
 # ROTAS DE INFORMAÇÃO E STATUS
@@ -38,10 +84,14 @@ def index():
             },
             "calculos": {
                 "/api/calcular/icms": "POST - Calcula valor do ICMS",
-                "/api/calcular/difal": "POST - Calcula DIFAL (Diferencial de Alíquota)"
+                "/api/calcular/icms/lote": "POST - Calcula ICMS de um lote de operações (body: operacoes)",
+                "/api/calcular/difal": "POST - Calcula DIFAL (Diferencial de Alíquota)",
+                "/api/calcular/difal/lote": "POST - Calcula DIFAL vetorizado (body colunar: origem, destino, valor_operacao)",
+                "/api/calcular/stream": "POST - Calcula ICMS/DIFAL em streaming (NDJSON ou CSV; params: calculo)"
             },
             "admin": {
-                "/api/admin/atualizar": "POST - Executa scraping e atualiza dados (requer autenticação futura)"
+                "/api/admin/atualizar": "POST - Enfileira scraping e atualização dos dados (requer autenticação futura)",
+                "/api/admin/atualizar/{job_id}": "GET - Status de uma atualização"
             }
         }
     })
@@ -50,7 +100,7 @@ def index():
 def health():
     """Health check da API"""
     try:
-        conectado, mensagem = db.verificar_conexao()
+        conectado, mensagem = obter_db().verificar_conexao()
         
         if conectado:
             return jsonify({
@@ -79,20 +129,19 @@ def health():
 def api_info():
     """Metadados e estatísticas da base de dados"""
     try:
-        estados = db.listar_estados()
-        aliquotas_internas = db.listar_aliquotas_internas()
-        matriz = db.obter_matriz_completa()
-        
-        total_interestaduais = sum(len(destinos) for destinos in matriz.values())
+        # Estatísticas materializadas a cada importação (sem consulta ao banco)
+        estatisticas = snapshot.obter_estatisticas()
         
         return jsonify({
             "estatisticas": {
-                "total_estados": len(estados),
-                "total_aliquotas_internas": len(aliquotas_internas),
-                "total_aliquotas_interestaduais": total_interestaduais
+                "total_estados": estatisticas['total_estados'],
+                "total_aliquotas_internas": estatisticas['total_aliquotas_internas'],
+                "total_aliquotas_interestaduais": estatisticas['total_aliquotas_interestaduais']
             },
-            "ultima_atualizacao": datetime.now().isoformat(),
-            "fonte": "conta_azul"
+            "ultima_atualizacao": estatisticas['ultima_atualizacao'],
+            "data_extracao": estatisticas['data_extracao'],
+            "duracao_ultima_atualizacao_segundos": estatisticas['duracao_segundos'],
+            "fonte": estatisticas['fonte']
         })
     except Exception as e:
         return jsonify({"error": str(e)}), 500
@@ -105,7 +154,7 @@ def api_info():
 def listar_estados():
     """Lista todos os estados brasileiros"""
     try:
-        estados = db.listar_estados()
+        estados = snapshot.listar_estados()
         
         return jsonify({
             "data": estados,
@@ -120,25 +169,16 @@ def obter_estado(uf):
     """Obtém informações de um estado específico"""
     try:
         uf = uf.upper()
-        estados = db.listar_estados()
-        estado = next((e for e in estados if e['uf'] == uf), None)
+        estado = snapshot.obter_estado(uf)
         
         if not estado:
             return jsonify({
                 "error": f"Estado '{uf}' não encontrado",
-                "valid_ufs": [e['uf'] for e in estados]
+                "valid_ufs": sorted(snapshot.ufs_validas())
             }), 404
         
-        # Busca alíquota interna
-        aliquota_interna = db.consultar_aliquota(uf, uf)
-        
         return jsonify({
-            "data": {
-                "uf": estado['uf'],
-                "nome": estado['nome'],
-                "regiao": estado['regiao'],
-                "aliquota_interna": float(aliquota_interna['aliquota']) if aliquota_interna else None
-            },
+            "data": estado,
             "timestamp": datetime.now().isoformat()
         })
     except Exception as e:
@@ -153,7 +193,11 @@ def obter_aliquota_interna(uf):
     """Obtém a alíquota interna de um estado específico"""
     try:
         uf = uf.upper()
-        resultado = db.consultar_aliquota(uf, uf)
+        
+        if uf not in snapshot.ufs_validas():
+            return jsonify({"error": f"Estado '{uf}' não encontrado"}), 404
+        
+        resultado = snapshot.consultar_aliquota(uf, uf)
         
         if not resultado:
             return jsonify({
@@ -176,7 +220,7 @@ def obter_aliquota_interna(uf):
 def listar_aliquotas_internas():
     """Lista todas as alíquotas internas"""
     try:
-        aliquotas = db.listar_aliquotas_internas()
+        aliquotas = snapshot.listar_aliquotas_internas()
         
         # Formato detalhado
         if request.args.get('format') == 'detailed':
@@ -216,8 +260,12 @@ def consultar_aliquota_interestadual():
             "example": "/api/aliquotas/interestadual?origem=SP&destino=RJ"
         }), 400
     
+    ufs_invalidas = [uf for uf in (origem, destino) if uf not in snapshot.ufs_validas()]
+    if ufs_invalidas:
+        return jsonify({"error": f"UF inválida: {', '.join(ufs_invalidas)}"}), 400
+    
     try:
-        resultado = db.consultar_aliquota(origem, destino)
+        resultado = snapshot.consultar_aliquota(origem, destino)
         
         if not resultado:
             return jsonify({
@@ -239,34 +287,57 @@ def consultar_aliquota_interestadual():
 
 @app.route("/api/aliquotas/matriz", methods=['GET'])
 def obter_matriz_completa():
-    """Retorna a matriz completa de alíquotas interestaduais"""
+    """
+    Retorna a matriz completa de alíquotas interestaduais
+    
+    O corpo é serializado uma vez por versão dos dados. Requisições com
+    If-None-Match / If-Modified-Since recebem 304 quando nada mudou.
+    """
     try:
-        matriz = db.obter_matriz_completa()
+        dados = snapshot.atual()
         
         # Opção de retornar em formato de lista para facilitar processamento
-        if request.args.get('format') == 'list':
-            lista = []
-            for origem, destinos in matriz.items():
-                for destino, aliquota in destinos.items():
-                    lista.append({
-                        "origem": origem,
-                        "destino": destino,
-                        "aliquota": aliquota
-                    })
-            
-            return jsonify({
-                "data": lista,
-                "total": len(lista),
-                "timestamp": datetime.now().isoformat()
-            })
+        formato = 'list' if request.args.get('format') == 'list' else 'nested'
+        etag = f"{dados.versao[:32]}-{formato}"
         
-        # Formato padrão: matriz aninhada
-        return jsonify({
-            "data": matriz,
-            "total_estados": len(matriz),
-            "total_combinacoes": sum(len(destinos) for destinos in matriz.values()),
-            "timestamp": datetime.now().isoformat()
-        })
+        cabecalhos = {
+            "Last-Modified": http_date(dados.ultima_modificacao),
+            "Cache-Control": "no-cache",
+            "Vary": "Accept-Encoding"
+        }
+        
+        # If-None-Match tem precedência sobre If-Modified-Since
+        if request.if_none_match:
+            nao_modificado = any(
+                request.if_none_match.contains_weak(candidata)
+                for candidata in (etag, f"{etag}-gzip", f"{etag}-br")
+            )
+        else:
+            nao_modificado = bool(
+                request.if_modified_since
+                and dados.ultima_modificacao <= request.if_modified_since
+            )
+        
+        codificacao = None
+        if brotli is not None and request.accept_encodings['br']:
+            codificacao = 'br'
+        elif request.accept_encodings['gzip']:
+            codificacao = 'gzip'
+        
+        if codificacao:
+            etag = f"{etag}-{codificacao}"
+            cabecalhos["Content-Encoding"] = codificacao
+        cabecalhos["ETag"] = f'"{etag}"'
+        
+        if nao_modificado:
+            cabecalhos.pop("Content-Encoding", None)
+            return Response(status=304, headers=cabecalhos)
+        
+        return Response(
+            dados.corpo_matriz(formato, codificacao),
+            mimetype='application/json',
+            headers=cabecalhos
+        )
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
@@ -274,6 +345,85 @@ def obter_matriz_completa():
 # ROTAS DE CÁLCULOS
 # ============================================
 
+def validar_operacao(dados, ufs_validas=None):
+    """
+    Valida uma operação de cálculo de ICMS
+
+    Retorna (origem, destino, valor, erro); erro é None quando a operação é válida.
+    ufs_validas permite reaproveitar o conjunto de UFs ao validar lotes.
+    """
+    if not isinstance(dados, dict):
+        return None, None, None, "Operação deve ser um objeto JSON"
+    
+    origem = dados.get('origem') or ''
+    destino = dados.get('destino') or ''
+    valor = dados.get('valor_operacao')
+    
+    if not isinstance(origem, str) or not isinstance(destino, str):
+        return None, None, None, "origem e destino devem ser siglas de UF"
+    
+    origem = origem.upper()
+    destino = destino.upper()
+    
+    if not all([origem, destino, valor]):
+        return origem, destino, None, "Campos obrigatórios: origem, destino, valor_operacao"
+    
+    if ufs_validas is None:
+        ufs_validas = snapshot.ufs_validas()
+    
+    ufs_invalidas = [uf for uf in (origem, destino) if uf not in ufs_validas]
+    if ufs_invalidas:
+        return origem, destino, None, f"UF inválida: {', '.join(ufs_invalidas)}"
+    
+    try:
+        valor = float(valor)
+    except (ValueError, TypeError):
+        return origem, destino, None, "valor_operacao deve ser um número"
+    
+    # NaN/Infinity passariam pela comparação abaixo e gerariam JSON inválido
+    if not math.isfinite(valor):
+        return origem, destino, None, "valor_operacao deve ser um número"
+    
+    if valor <= 0:
+        return origem, destino, None, "valor_operacao deve ser maior que zero"
+    
+    # Valores maiores estourariam float64 nos resultados (Infinity no JSON)
+    if valor > VALOR_OPERACAO_MAXIMO:
+        return origem, destino, None, f"valor_operacao deve ser no máximo {VALOR_OPERACAO_MAXIMO:.0e}"
+    
+    return origem, destino, valor, None
+
+def montar_resultado_icms(origem, destino, valor, aliquota):
+    """Monta o resultado do cálculo de ICMS para uma operação"""
+    valor_icms = valor * (aliquota / 100)
+    
+    return {
+        "origem": origem,
+        "destino": destino,
+        "valor_operacao": valor,
+        "aliquota_percentual": aliquota,
+        "valor_icms": round(valor_icms, 2),
+        "valor_com_icms": round(valor + valor_icms, 2),
+        "tipo": "interna" if origem == destino else "interestadual"
+    }
+
+def montar_resultado_difal(origem, destino, valor, aliquota_inter, aliquota_interna):
+    """Monta o resultado do cálculo de DIFAL para uma operação"""
+    diferencial = aliquota_interna - aliquota_inter
+    valor_difal = valor * (diferencial / 100)
+    
+    return {
+        "origem": origem,
+        "destino": destino,
+        "valor_operacao": valor,
+        "aliquota_interestadual": aliquota_inter,
+        "aliquota_interna_destino": aliquota_interna,
+        "diferencial_aliquota": round(diferencial, 2),
+        "valor_difal": round(valor_difal, 2),
+        "valor_icms_origem": round(valor * (aliquota_inter / 100), 2),
+        "valor_icms_total": round(valor * (aliquota_interna / 100), 2)
+    }
+
 @app.route("/api/calcular/icms", methods=['POST'])
 def calcular_icms():
     """
@@ -299,43 +449,86 @@ def calcular_icms():
                 }
             }), 400
         
-        origem = dados.get('origem', '').upper()
-        destino = dados.get('destino', '').upper()
-        valor = dados.get('valor_operacao')
-        
-        if not all([origem, destino, valor]):
-            return jsonify({
-                "error": "Campos obrigatórios: origem, destino, valor_operacao"
-            }), 400
-        
-        try:
-            valor = float(valor)
-        except (ValueError, TypeError):
-            return jsonify({"error": "valor_operacao deve ser um número"}), 400
+        origem, destino, valor, erro = validar_operacao(dados)
         
-        if valor <= 0:
-            return jsonify({"error": "valor_operacao deve ser maior que zero"}), 400
+        if erro:
+            return jsonify({"error": erro}), 400
         
-        resultado = db.consultar_aliquota(origem, destino)
+        resultado = snapshot.consultar_aliquota(origem, destino)
         
         if not resultado:
             return jsonify({
                 "error": f"Alíquota não encontrada para {origem} → {destino}"
             }), 404
         
-        aliquota = float(resultado['aliquota'])
-        valor_icms = valor * (aliquota / 100)
+        return jsonify({
+            "data": montar_resultado_icms(origem, destino, valor, float(resultado['aliquota'])),
+            "timestamp": datetime.now().isoformat()
+        })
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+@app.route("/api/calcular/icms/lote", methods=['POST'])
+def calcular_icms_lote():
+    """
+    Calcula o valor do ICMS para um lote de operações
+    
+    Body (JSON):
+    {
+        "operacoes": [
+            {"origem": "SP", "destino": "RJ", "valor_operacao": 1000.00},
+            {"origem": "MG", "destino": "BA", "valor_operacao": 250.00}
+        ]
+    }
+    
+    Os resultados seguem a ordem das operações. Erros de validação são
+    reportados na posição da operação, sem interromper o restante do lote.
+    """
+    try:
+        dados = request.get_json(silent=True)
+        operacoes = dados.get('operacoes') if isinstance(dados, dict) else dados
+        
+        if not isinstance(operacoes, list) or not operacoes:
+            return jsonify({
+                "error": "Campo 'operacoes' com uma lista não vazia é obrigatório",
+                "example": {
+                    "operacoes": [
+                        {"origem": "SP", "destino": "RJ", "valor_operacao": 1000.00}
+                    ]
+                }
+            }), 400
+        
+        if len(operacoes) > Config.LOTE_MAX_OPERACOES:
+            return jsonify({
+                "error": f"Lote excede o limite de {Config.LOTE_MAX_OPERACOES} operações"
+            }), 413
+        
+        # Uma única versão do snapshot para todo o lote
+        versao = snapshot.atual()
+        matriz = versao.matriz
+        
+        resultados = []
+        total_erros = 0
+        
+        for indice, operacao in enumerate(operacoes):
+            origem, destino, valor, erro = validar_operacao(operacao, versao.ufs)
+            
+            if not erro:
+                aliquota = matriz.aliquota(origem, destino)
+                if aliquota is None:
+                    erro = f"Alíquota não encontrada para {origem} → {destino}"
+            
+            if erro:
+                total_erros += 1
+                resultados.append({"indice": indice, "error": erro})
+            else:
+                resultados.append(montar_resultado_icms(origem, destino, valor, aliquota))
         
         return jsonify({
-            "data": {
-                "origem": origem,
-                "destino": destino,
-                "valor_operacao": valor,
-                "aliquota_percentual": aliquota,
-                "valor_icms": round(valor_icms, 2),
-                "valor_com_icms": round(valor + valor_icms, 2),
-                "tipo": "interna" if origem == destino else "interestadual"
-            },
+            "data": resultados,
+            "total": len(resultados),
+            "total_sucesso": len(resultados) - total_erros,
+            "total_erros": total_erros,
             "timestamp": datetime.now().isoformat()
         })
     except Exception as e:
@@ -366,25 +559,18 @@ def calcular_difal():
                 }
             }), 400
         
-        origem = dados.get('origem', '').upper()
-        destino = dados.get('destino', '').upper()
-        valor = dados.get('valor_operacao')
+        origem, destino, valor, erro = validar_operacao(dados)
+        
+        if erro:
+            return jsonify({"error": erro}), 400
         
         if origem == destino:
             return jsonify({
                 "error": "DIFAL não se aplica para operações dentro do mesmo estado"
             }), 400
         
-        try:
-            valor = float(valor)
-        except (ValueError, TypeError):
-            return jsonify({"error": "valor_operacao deve ser um número"}), 400
-        
-        if valor <= 0:
-            return jsonify({"error": "valor_operacao deve ser maior que zero"}), 400
-        
         # Busca alíquota interestadual
-        aliq_inter = db.consultar_aliquota(origem, destino)
+        aliq_inter = snapshot.consultar_aliquota(origem, destino)
         
         if not aliq_inter:
             return jsonify({
@@ -392,36 +578,265 @@ def calcular_difal():
             }), 404
         
         # Busca alíquota interna do destino
-        aliq_interna = db.consultar_aliquota(destino, destino)
+        aliq_interna = snapshot.consultar_aliquota(destino, destino)
         
         if not aliq_interna:
             return jsonify({
                 "error": "Alíquota interna do destino não encontrada"
             }), 404
         
-        aliquota_inter = float(aliq_inter['aliquota'])
-        aliquota_interna = float(aliq_interna['aliquota'])
+        return jsonify({
+            "data": montar_resultado_difal(
+                origem,
+                destino,
+                valor,
+                float(aliq_inter['aliquota']),
+                float(aliq_interna['aliquota'])
+            ),
+            "timestamp": datetime.now().isoformat()
+        })
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+@app.route("/api/calcular/difal/lote", methods=['POST'])
+def calcular_difal_lote():
+    """
+    Calcula o DIFAL para um lote de operações de forma vetorizada
+    
+    Body (JSON) em formato colunar:
+    {
+        "origem": ["SP", "MG"],
+        "destino": ["BA", "RJ"],
+        "valor_operacao": [1000.00, 250.00]
+    }
+    
+    Também aceita {"operacoes": [{"origem", "destino", "valor_operacao"}, ...]}.
+    A resposta é colunar, na mesma ordem; linhas inválidas ficam com null
+    e são listadas em "erros".
+    """
+    try:
+        dados = request.get_json(silent=True)
+        
+        if not isinstance(dados, dict):
+            return jsonify({
+                "error": "Body JSON é obrigatório",
+                "example": {
+                    "origem": ["SP", "MG"],
+                    "destino": ["BA", "RJ"],
+                    "valor_operacao": [1000.00, 250.00]
+                }
+            }), 400
+        
+        if isinstance(dados.get('operacoes'), list):
+            operacoes = [op if isinstance(op, dict) else {} for op in dados['operacoes']]
+            origens = [op.get('origem') for op in operacoes]
+            destinos = [op.get('destino') for op in operacoes]
+            valores = [op.get('valor_operacao') for op in operacoes]
+        else:
+            origens = dados.get('origem')
+            destinos = dados.get('destino')
+            valores = dados.get('valor_operacao')
+            
+            if not all(isinstance(coluna, list) for coluna in (origens, destinos, valores)):
+                return jsonify({
+                    "error": "Campos obrigatórios (listas): origem, destino, valor_operacao"
+                }), 400
+            
+            if not len(origens) == len(destinos) == len(valores):
+                return jsonify({
+                    "error": "origem, destino e valor_operacao devem ter o mesmo tamanho"
+                }), 400
+        
+        if not origens:
+            return jsonify({"error": "Lote vazio"}), 400
+        
+        if len(origens) > Config.LOTE_MAX_OPERACOES:
+            return jsonify({
+                "error": f"Lote excede o limite de {Config.LOTE_MAX_OPERACOES} operações"
+            }), 413
+        
+        indices_origem = indices_ufs(origens)
+        indices_destino = indices_ufs(destinos)
+        valores = converter_valores(valores)
+        
+        resultado = calcular_difal_vetorizado(
+            snapshot.atual().matriz.valores,
+            indices_origem,
+            indices_destino,
+            valores
+        )
+        
+        erro = resultado.pop('erro')
+        linhas_invalidas = np.flatnonzero(erro).tolist()
+        
+        colunas = {
+            "origem": [UFS[i] if i >= 0 else None for i in indices_origem.tolist()],
+            "destino": [UFS[i] if i >= 0 else None for i in indices_destino.tolist()],
+            "valor_operacao": valores.tolist()
+        }
+        for nome, valores_coluna in resultado.items():
+            colunas[nome] = valores_coluna.tolist()
+        
+        # NaN não é JSON válido: linhas inválidas são devolvidas como null
+        for nome in resultado:
+            coluna = colunas[nome]
+            for i in linhas_invalidas:
+                coluna[i] = None
         
-        diferencial = aliquota_interna - aliquota_inter
-        valor_difal = valor * (diferencial / 100)
+        for i in linhas_invalidas:
+            if not np.isfinite(valores[i]):
+                colunas["valor_operacao"][i] = None
+        
+        erros = [
+            {"indice": i, "error": MENSAGENS_ERRO[int(erro[i])]}
+            for i in linhas_invalidas
+        ]
         
         return jsonify({
-            "data": {
-                "origem": origem,
-                "destino": destino,
-                "valor_operacao": valor,
-                "aliquota_interestadual": aliquota_inter,
-                "aliquota_interna_destino": aliquota_interna,
-                "diferencial_aliquota": round(diferencial, 2),
-                "valor_difal": round(valor_difal, 2),
-                "valor_icms_origem": round(valor * (aliquota_inter / 100), 2),
-                "valor_icms_total": round(valor * (aliquota_interna / 100), 2)
-            },
+            "data": colunas,
+            "erros": erros,
+            "total": len(erro),
+            "total_sucesso": len(erro) - len(erros),
+            "total_erros": len(erros),
             "timestamp": datetime.now().isoformat()
         })
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
+# Colunas da saída CSV do cálculo em streaming
+COLUNAS_STREAM = {
+    'icms': ['linha', 'origem', 'destino', 'valor_operacao', 'aliquota_percentual',
+             'valor_icms', 'valor_com_icms', 'tipo', 'erro'],
+    'difal': ['linha', 'origem', 'destino', 'valor_operacao', 'aliquota_interestadual',
+              'aliquota_interna_destino', 'diferencial_aliquota', 'valor_difal',
+              'valor_icms_origem', 'valor_icms_total', 'erro']
+}
+
+def ler_operacoes_stream(texto, formato):
+    """Lê operações do corpo da requisição linha a linha, sem carregá-lo inteiro"""
+    if formato == 'csv':
+        for linha, operacao in enumerate(csv.DictReader(texto), start=1):
+            yield linha, operacao, None
+        return
+    
+    linha = 0
+    for conteudo in texto:
+        if not conteudo.strip():
+            continue
+        linha += 1
+        try:
+            yield linha, json.loads(conteudo), None
+        except ValueError:
+            yield linha, None, "Linha não é um JSON válido"
+
+def calcular_operacao_stream(versao, operacao, calculo):
+    """Calcula uma operação do streaming; retorna (resultado, erro)"""
+    origem, destino, valor, erro = validar_operacao(operacao, versao.ufs)
+    
+    if erro:
+        return None, erro
+    
+    matriz = versao.matriz
+    aliquota = matriz.aliquota(origem, destino)
+    
+    if calculo == 'icms':
+        if aliquota is None:
+            return None, f"Alíquota não encontrada para {origem} → {destino}"
+        return montar_resultado_icms(origem, destino, valor, aliquota), None
+    
+    if origem == destino:
+        return None, "DIFAL não se aplica para operações dentro do mesmo estado"
+    if aliquota is None:
+        return None, "Alíquota interestadual não encontrada"
+    
+    # Alíquota interna do destino: diagonal da matriz, como no DIFAL em lote
+    aliquota_interna = matriz.aliquota(destino, destino)
+    if aliquota_interna is None:
+        return None, "Alíquota interna do destino não encontrada"
+    
+    return montar_resultado_difal(origem, destino, valor, aliquota, aliquota_interna), None
+
+@app.route("/api/calcular/stream", methods=['POST'])
+def calcular_stream():
+    """
+    Calcula ICMS ou DIFAL em streaming para arquivos grandes
+    
+    Corpo em NDJSON (Content-Type: application/x-ndjson), uma operação por linha:
+        {"origem": "SP", "destino": "RJ", "valor_operacao": 1000.00}
+    
+    ou CSV (Content-Type: text/csv) com cabeçalho origem,destino,valor_operacao.
+    
+    Query params: calculo=icms|difal (padrão: icms).
+    A resposta usa o mesmo formato da entrada e é enviada em blocos
+    enquanto o corpo é lido; erros são reportados na linha correspondente.
+    """
+    calculo = request.args.get('calculo', 'icms').lower()
+    
+    if calculo not in COLUNAS_STREAM:
+        return jsonify({"error": "Parâmetro 'calculo' deve ser 'icms' ou 'difal'"}), 400
+    
+    if request.mimetype == 'text/csv':
+        formato = 'csv'
+    elif request.mimetype in ('application/x-ndjson', 'application/jsonl', 'application/json-seq'):
+        formato = 'ndjson'
+    else:
+        return jsonify({
+            "error": "Content-Type deve ser application/x-ndjson ou text/csv"
+        }), 415
+    
+    # Uma única versão do snapshot para todo o arquivo
+    versao = snapshot.atual()
+    # utf-8-sig descarta o BOM dos CSVs exportados pelo Excel
+    texto = io.TextIOWrapper(request.stream, encoding='utf-8-sig', newline='')
+    colunas = COLUNAS_STREAM[calculo]
+    
+    def gerar():
+        buffer = io.StringIO()
+        escritor = csv.writer(buffer) if formato == 'csv' else None
+        
+        def escrever(linha, resultado, erro):
+            if escritor:
+                if erro:
+                    escritor.writerow([linha] + [''] * (len(colunas) - 2) + [erro])
+                else:
+                    escritor.writerow([linha] + [resultado[c] for c in colunas[1:-1]] + [''])
+                return
+            
+            saida = {"linha": linha, "error": erro} if erro else {"linha": linha, **resultado}
+            try:
+                linha_json = json.dumps(saida, ensure_ascii=False, allow_nan=False)
+            except ValueError:
+                # Nunca emite NaN/Infinity: a linha inteira deixaria de ser JSON válido
+                linha_json = json.dumps({"linha": linha, "error": "Resultado não numérico"}, ensure_ascii=False)
+            buffer.write(linha_json)
+            buffer.write('\n')
+        
+        if escritor:
+            escritor.writerow(colunas)
+        
+        linha = 0
+        try:
+            for linha, operacao, erro in ler_operacoes_stream(texto, formato):
+                resultado = None
+                if not erro:
+                    resultado, erro = calcular_operacao_stream(versao, operacao, calculo)
+                escrever(linha, resultado, erro)
+                
+                # Envia em blocos para não pagar uma escrita por linha
+                if buffer.tell() >= Config.STREAM_TAMANHO_BLOCO:
+                    yield buffer.getvalue()
+                    buffer.seek(0)
+                    buffer.truncate()
+        except UnicodeDecodeError:
+            # O status 200 já foi enviado: o erro vai como última linha e a leitura para
+            escrever(linha + 1, None, "Corpo da requisição não está em UTF-8")
+        
+        if buffer.tell():
+            yield buffer.getvalue()
+    
+    mimetype = 'text/csv' if formato == 'csv' else 'application/x-ndjson'
+    return Response(stream_with_context(gerar()), mimetype=mimetype)
+
 # ============================================
 # ROTAS ADMINISTRATIVAS
 # ============================================
@@ -429,56 +844,53 @@ def calcular_difal():
 @app.route("/api/admin/atualizar", methods=['POST'])
 def atualizar_dados():
     """
-    Força atualização dos dados via scraping
+    Enfileira a atualização dos dados via scraping
     
-    ATENÇÃO: Esta operação pode demorar alguns minutos
+    Retorna imediatamente (202) com o id do job; o andamento é consultado em
+    GET /api/admin/atualizar/<job_id>. Se já houver uma atualização em
+    execução, o pedido é associado a ela.
     """
     try:
-        from icms_scraper import ICMS_Scraper
-        
-        print("🚀 Iniciando scraping...")
-        scraper = ICMS_Scraper()
-        scraper.scrape()
-        
-        # Salva temporariamente em JSON
-        json_file = 'temp_icms.json'
-        scraper.salvar_json(json_file)
-        scraper.fechar()
-        
-        # Importa para o Supabase
-        print("📤 Importando para Supabase...")
-        resultado = db.importar_json(json_file)
-        
-        # Remove arquivo temporário
-        if os.path.exists(json_file):
-            os.remove(json_file)
+        job, criado = atualizacoes.iniciar()
         
-        if resultado['sucesso']:
-            return jsonify({
-                "status": "success",
-                "message": "Dados atualizados com sucesso",
-                "data": {
-                    "total_registros": resultado['total_registros'],
-                    "total_internas": resultado['total_internas'],
-                    "total_interestaduais": resultado['total_interestaduais']
-                },
-                "timestamp": datetime.now().isoformat()
-            })
-        else:
+        if not job:
             return jsonify({
                 "status": "error",
-                "message": "Falha ao atualizar dados",
-                "error": resultado.get('erro'),
+                "message": "Atualização em andamento, mas seu status não está disponível",
                 "timestamp": datetime.now().isoformat()
-            }), 500
+            }), 409
+        
+        return jsonify({
+            "status": "accepted",
+            "message": "Atualização iniciada" if criado else "Atualização já em andamento",
+            "data": {
+                "job_id": job['id'],
+                "fase": job['fase'],
+                "status_url": f"/api/admin/atualizar/{job['id']}"
+            },
+            "timestamp": datetime.now().isoformat()
+        }), 202
             
     except Exception as e:
         return jsonify({
             "status": "error",
-            "message": f"Falha ao atualizar: {str(e)}",
+            "message": f"Falha ao iniciar atualização: {str(e)}",
             "timestamp": datetime.now().isoformat()
         }), 500
 
+@app.route("/api/admin/atualizar/<string:job_id>", methods=['GET'])
+def status_atualizacao(job_id):
+    """Status de uma atualização: fase, tempos por fase e resultado"""
+    job = atualizacoes.obter(job_id)
+    
+    if not job:
+        return jsonify({"error": f"Atualização '{job_id}' não encontrada"}), 404
+    
+    return jsonify({
+        "data": job,
+        "timestamp": datetime.now().isoformat()
+    })
+
 # ============================================
 # TRATAMENTO DE ERROS
 # ============================================
@@ -518,8 +930,11 @@ if __name__ == '__main__':
     try:
         Config.validate()
         print(f"✅ Configurações validadas")
+        snapshot.carregar()
+        iniciar_agendador()
         print(f"🚀 Iniciando API na porta {Config.FLASK_PORT}")
         print(f"📚 Documentação disponível em: http://127.0.0.1:{Config.FLASK_PORT}/")
-        app.run(host='127.0.0.1', port=Config.FLASK_PORT, debug=True)
+        print(f"⚠️ Servidor de desenvolvimento; em produção use: gunicorn -c gunicorn.conf.py api:app")
+        app.run(host='127.0.0.1', port=Config.FLASK_PORT, debug=Config.FLASK_ENV == 'development')
     except ValueError as e:
         print(f"❌ Erro de configuração: {e}")
\ No newline at end of file
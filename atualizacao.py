@@ -0,0 +1,377 @@
+import json
+import os
+import random
+import socket
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from datetime import datetime
+from config import Config
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+
+class ErroAtualizacao(Exception):
+    """Falha em uma fase da atualização"""
+
+
+_processo = (None, None)
+
+
+def id_processo():
+    """
+    Identificador deste processo, único entre contêineres
+
+    PIDs se repetem entre contêineres que compartilham ATUALIZACAO_DIR; o id
+    junta hostname, PID e um sufixo aleatório, e é recriado após um fork
+    (workers do gunicorn com preload).
+    """
+    global _processo
+    pid = os.getpid()
+    if _processo[0] != pid:
+        _processo = (pid, f"{socket.gethostname()}-{pid}-{uuid.uuid4().hex[:8]}")
+    return _processo[1]
+
+
+class GerenciadorAtualizacao:
+    """
+    Executa a atualização (scraping + importação) em segundo plano
+
+    Só uma atualização roda por vez entre todos os workers: a exclusão é
+    garantida por um lock de arquivo (flock) no diretório compartilhado,
+    onde também ficam os status dos jobs. Um novo pedido enquanto há job
+    em execução recebe o id desse job.
+    """
+
+    # Quantidade de jobs finalizados mantidos no diretório
+    MAX_JOBS_GUARDADOS = 50
+
+    def __init__(self, obter_db, snapshot, diretorio=None):
+        self.obter_db = obter_db
+        self.snapshot = snapshot
+        self.diretorio = diretorio or Config.ATUALIZACAO_DIR
+        self.diretorio_jobs = os.path.join(self.diretorio, 'jobs')
+        self.arquivo_lock = os.path.join(self.diretorio, 'atualizacao.lock')
+        self.arquivo_atual = os.path.join(self.diretorio, 'job_atual')
+        self._lock_local = threading.Lock()
+
+    # ----------------------------------------
+    # Lock entre processos
+    # ----------------------------------------
+
+    def _tentar_lock(self):
+        """Tenta obter o lock de atualização sem bloquear; retorna o handle ou None"""
+        os.makedirs(self.diretorio_jobs, exist_ok=True)
+
+        if not self._lock_local.acquire(blocking=False):
+            return None
+
+        if fcntl is None:
+            # Sem flock (ex.: Windows/waitress): processo único, basta o lock local
+            return True
+
+        try:
+            arquivo = open(self.arquivo_lock, 'a')
+        except BaseException:
+            # Sem o arquivo (permissão, disco cheio) o lock local não pode ficar preso
+            self._lock_local.release()
+            raise
+
+        try:
+            fcntl.flock(arquivo, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            return arquivo
+        except OSError:
+            arquivo.close()
+            self._lock_local.release()
+            return None
+        except BaseException:
+            arquivo.close()
+            self._lock_local.release()
+            raise
+
+    def _liberar_lock(self, handle):
+        """Libera o lock obtido em _tentar_lock"""
+        if handle is not True:
+            fcntl.flock(handle, fcntl.LOCK_UN)
+            handle.close()
+        self._lock_local.release()
+
+    # ----------------------------------------
+    # Persistência dos jobs
+    # ----------------------------------------
+
+    def _caminho_job(self, job_id):
+        return os.path.join(self.diretorio_jobs, f"{job_id}.json")
+
+    def _gravar_atomico(self, caminho, conteudo):
+        temporario = f"{caminho}.{id_processo()}.tmp"
+        with open(temporario, 'w', encoding='utf-8') as f:
+            f.write(conteudo)
+        os.replace(temporario, caminho)
+
+    def _salvar_job(self, job):
+        self._gravar_atomico(
+            self._caminho_job(job['id']),
+            json.dumps(job, ensure_ascii=False, default=str)
+        )
+
+    def obter(self, job_id):
+        """Retorna o status de um job (de qualquer worker) ou None"""
+        # job_id vem da URL: aceita apenas o formato gerado aqui
+        if not job_id or not all(c in '0123456789abcdef' for c in job_id):
+            return None
+
+        try:
+            with open(self._caminho_job(job_id), 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def job_atual(self):
+        """Retorna o último job iniciado (em execução ou não) ou None"""
+        try:
+            with open(self.arquivo_atual, 'r', encoding='utf-8') as f:
+                return self.obter(f.read().strip())
+        except OSError:
+            return None
+
+    def _limpar_jobs_antigos(self):
+        """Mantém apenas os jobs mais recentes no diretório"""
+        try:
+            arquivos = sorted(
+                (os.path.join(self.diretorio_jobs, nome) for nome in os.listdir(self.diretorio_jobs)
+                 if nome.endswith('.json')),
+                key=os.path.getmtime,
+                reverse=True
+            )
+            for caminho in arquivos[self.MAX_JOBS_GUARDADOS:]:
+                os.remove(caminho)
+        except OSError:
+            pass
+
+    # ----------------------------------------
+    # Execução
+    # ----------------------------------------
+
+    def iniciar(self, origem='api'):
+        """
+        Enfileira uma atualização
+
+        Retorna (job, criado). Se já houver uma atualização em andamento,
+        retorna esse job com criado=False.
+        """
+        handle = self._tentar_lock()
+
+        if handle is None:
+            # Outro worker acabou de obter o lock: aguarda ele publicar o job
+            for _ in range(20):
+                job = self.job_atual()
+                if job and job['status'] == 'executando':
+                    return job, False
+                time.sleep(0.05)
+            return self.job_atual(), False
+
+        job = {
+            'id': uuid.uuid4().hex,
+            'status': 'executando',
+            'fase': 'na_fila',
+            'origem': origem,
+            'pid': os.getpid(),
+            'processo': id_processo(),
+            'criado_em': datetime.now().isoformat(),
+            'finalizado_em': None,
+            'fases': {},
+            'resultado': None,
+            'erro': None
+        }
+
+        try:
+            self._salvar_job(job)
+            self._gravar_atomico(self.arquivo_atual, job['id'])
+            self._limpar_jobs_antigos()
+            threading.Thread(target=self._executar, args=(job, handle), daemon=True).start()
+        except Exception:
+            self._liberar_lock(handle)
+            raise
+
+        return job, True
+
+    @contextmanager
+    def _fase(self, job, nome):
+        """Registra início e duração de uma fase do job"""
+        job['fase'] = nome
+        job['fases'][nome] = {'inicio': datetime.now().isoformat(), 'duracao_segundos': None}
+        self._salvar_job(job)
+        inicio = time.monotonic()
+        try:
+            yield
+        finally:
+            job['fases'][nome]['duracao_segundos'] = round(time.monotonic() - inicio, 3)
+            self._salvar_job(job)
+
+    def _executar(self, job, handle):
+        """Pipeline completo: scraping, importação e recarga do snapshot"""
+        try:
+            with self._fase(job, 'scraping'):
+                from icms_scraper import ICMS_Scraper
+
+                print("🚀 Iniciando scraping...")
+                scraper = ICMS_Scraper()
+                try:
+                    matriz = scraper.scrape()
+
+                    if not matriz and not scraper.sem_alteracao:
+                        raise ErroAtualizacao(
+                            f"Falha ao extrair dados de todas as fontes: {'; '.join(scraper.erros)}"
+                        )
+
+                    # Artefato opcional, com nome único por execução
+                    if matriz and Config.SCRAPING_ARTEFATOS_DIR:
+                        os.makedirs(Config.SCRAPING_ARTEFATOS_DIR, exist_ok=True)
+                        nome_arquivo = f"icms_{datetime.now().strftime('%Y%m%d_%H%M%S')}_{job['id'][:8]}.json"
+                        scraper.salvar_json(os.path.join(Config.SCRAPING_ARTEFATOS_DIR, nome_arquivo))
+
+                    dados = scraper.get_dados_completos() if matriz else None
+                finally:
+                    scraper.fechar()
+
+            if dados is None:
+                # Fontes inalteradas desde a última importação: nada a importar,
+                # apenas guarda os ETag/Last-Modified renovados pelas fontes
+                scraper.confirmar_validadores()
+                job['status'] = 'concluido'
+                job['fase'] = 'concluido'
+                job['resultado'] = {'sem_alteracao': True}
+                return
+
+            with self._fase(job, 'importando'):
+                # Importa para o Supabase direto da memória
+                print("📤 Importando para Supabase...")
+                resultado = self.obter_db().importar_dados(dados)
+
+                if not resultado['sucesso']:
+                    raise ErroAtualizacao(f"Falha ao importar dados: {resultado.get('erro')}")
+
+                # Só agora as fontes podem ser consideradas "já importadas". Com
+                # lotes que falharam (importação parcial), os validadores não são
+                # gravados: a próxima execução lê as fontes e reenvia as alterações
+                if resultado['erros']:
+                    print("⚠️ Importação parcial: validadores das fontes não gravados")
+                else:
+                    scraper.confirmar_validadores()
+
+            with self._fase(job, 'recarregando'):
+                # Troca o snapshot em memória pela versão recém-importada
+                self.snapshot.carregar()
+
+            job['status'] = 'concluido'
+            job['fase'] = 'concluido'
+            job['resultado'] = {
+                'total_registros': resultado['total_registros'],
+                'total_internas': resultado['total_internas'],
+                'total_interestaduais': resultado['total_interestaduais'],
+                'total_removidas': resultado['total_removidas'],
+                'alteracoes': resultado['alteracoes'],
+                'erros': resultado['erros']
+            }
+        except Exception as e:
+            print(f"❌ Falha na atualização {job['id']}: {e}")
+            job['status'] = 'erro'
+            job['erro'] = str(e)
+        finally:
+            job['finalizado_em'] = datetime.now().isoformat()
+            try:
+                self._salvar_job(job)
+            finally:
+                self._liberar_lock(handle)
+
+
+class AgendadorAtualizacao:
+    """
+    Dispara a atualização periodicamente dentro da própria API
+
+    Todos os workers rodam o agendador, mas o lock do GerenciadorAtualizacao
+    garante que só um execute o pipeline; os demais apenas recarregam o
+    snapshot quando percebem um job concluído. Com vários contêineres, o
+    ATUALIZACAO_DIR precisa estar em um volume compartilhado.
+    """
+
+    def __init__(self, gerenciador, intervalo=None, jitter=None, verificacao=None):
+        self.gerenciador = gerenciador
+        self.intervalo = Config.AGENDADOR_INTERVALO if intervalo is None else intervalo
+        self.jitter = Config.AGENDADOR_JITTER if jitter is None else jitter
+        self.verificacao = Config.AGENDADOR_VERIFICACAO if verificacao is None else verificacao
+        self._parar = threading.Event()
+        self._thread = None
+        self._ultimo_job_visto = None
+
+    def iniciar(self):
+        """Inicia a thread do agendador (uma por processo)"""
+        if self._thread and self._thread.is_alive():
+            return False
+
+        self._parar.clear()
+        self._thread = threading.Thread(target=self._loop, name='agendador-atualizacao', daemon=True)
+        self._thread.start()
+        print(f"⏰ Agendador de atualização ativo: a cada {self.intervalo}s (+ até {self.jitter}s)")
+        return True
+
+    def parar(self):
+        """Encerra a thread do agendador"""
+        self._parar.set()
+        if self._thread:
+            self._thread.join(timeout=5)
+
+    def _proximo_disparo(self, referencia):
+        return referencia + self.intervalo + random.uniform(0, self.jitter)
+
+    def _segundos_desde(self, iso):
+        try:
+            return (datetime.now() - datetime.fromisoformat(iso)).total_seconds()
+        except (TypeError, ValueError):
+            return None
+
+    def _verificar_job_concluido(self, job):
+        """Recarrega o snapshot quando outro processo concluiu uma atualização"""
+        if not job or job['status'] != 'concluido' or job['id'] == self._ultimo_job_visto:
+            return
+
+        self._ultimo_job_visto = job['id']
+        if (job.get('resultado') or {}).get('sem_alteracao'):
+            return
+        if job.get('processo') != id_processo():
+            print(f"🔄 Atualização {job['id'][:8]} concluída em outro processo; recarregando snapshot")
+            self.gerenciador.snapshot.carregar()
+
+    def _loop(self):
+        # Job já concluído antes de este processo subir não dispara recarga
+        job = self.gerenciador.job_atual()
+        self._ultimo_job_visto = job['id'] if job else None
+        proximo = self._proximo_disparo(time.monotonic())
+
+        while not self._parar.wait(self.verificacao):
+            try:
+                job = self.gerenciador.job_atual()
+                self._verificar_job_concluido(job)
+
+                if time.monotonic() < proximo:
+                    continue
+
+                # Outro worker já atualizou (ou tentou e falhou) dentro do intervalo:
+                # apenas reagenda, sem repetir o scraping em cada worker após um erro
+                if job and job['status'] in ('executando', 'concluido', 'erro'):
+                    decorrido = self._segundos_desde(job.get('finalizado_em') or job.get('criado_em'))
+                    if decorrido is not None and decorrido < self.intervalo:
+                        proximo = self._proximo_disparo(time.monotonic() - decorrido)
+                        continue
+
+                job, criado = self.gerenciador.iniciar(origem='agendador')
+                if criado:
+                    print(f"⏰ Atualização agendada iniciada: {job['id']}")
+                proximo = self._proximo_disparo(time.monotonic())
+            except Exception as e:
+                print(f"❌ Erro no agendador de atualização: {e}")
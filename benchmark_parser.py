@@ -0,0 +1,108 @@
+"""
+Benchmark do parser de tabelas sobre as fixtures HTML gravadas
+
+Mede, por fonte, o tempo de extração (extrair_tabelas + ler_matriz_aliquotas)
+e o pico de memória alocada, sem rede nem navegador.
+
+As fixtures de fixtures/ acompanham o repositório, então o benchmark roda
+no CI sem acesso às fontes. Regravá-las (acessa as fontes reais):
+    SCRAPING_FIXTURES_MODO=gravar python -c "from icms_scraper import ICMS_Scraper; ICMS_Scraper().scrape()"
+
+Uso: python benchmark_parser.py [--dir fixtures] [--repeticoes 50] [--limite-ms 50] [--json]
+
+Um --dir relativo é resolvido a partir do diretório deste arquivo.
+
+Com --limite-ms, termina com código 1 se a mediana de alguma fonte passar do
+limite (útil para proteger a performance da extração no CI).
+"""
+import argparse
+import glob
+import json
+import os
+import statistics
+import sys
+import time
+import tracemalloc
+from config import Config
+from tabelas_html import extrair_tabelas, ler_matriz_aliquotas
+from ufs import UFS
+
+
+def extrair(html):
+    """Mesmo caminho do scraper: primeira tabela do HTML e leitura das alíquotas"""
+    tabelas = extrair_tabelas(html)
+    if len(tabelas) == 0:
+        raise ValueError("Nenhuma tabela encontrada")
+    return ler_matriz_aliquotas(tabelas[0], UFS)
+
+
+def medir_fonte(caminho, repeticoes):
+    """Executa o parser sobre uma fixture e retorna as métricas"""
+    with open(caminho, 'r', encoding='utf-8') as f:
+        html = f.read()
+
+    # Aquecimento e validação do resultado
+    matriz, aliquotas_internas, _ = extrair(html)
+
+    tempos = []
+    for _ in range(repeticoes):
+        inicio = time.perf_counter()
+        extrair(html)
+        tempos.append((time.perf_counter() - inicio) * 1000)
+
+    tracemalloc.start()
+    extrair(html)
+    _, pico = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return {
+        'fonte': os.path.splitext(os.path.basename(caminho))[0],
+        'tamanho_html_kb': round(len(html.encode('utf-8')) / 1024, 1),
+        'estados': len(matriz),
+        'aliquotas': sum(len(destinos) for destinos in matriz.values()),
+        'aliquotas_internas': len(aliquotas_internas),
+        'mediana_ms': round(statistics.median(tempos), 3),
+        'minimo_ms': round(min(tempos), 3),
+        'maximo_ms': round(max(tempos), 3),
+        'pico_memoria_kb': round(pico / 1024, 1)
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark do parser de tabelas de alíquotas")
+    parser.add_argument('--dir', default=Config.SCRAPING_FIXTURES_DIR, help="Diretório das fixtures (*.html)")
+    parser.add_argument('--repeticoes', type=int, default=50)
+    parser.add_argument('--limite-ms', type=float, default=None, help="Mediana máxima aceita por fonte")
+    parser.add_argument('--json', action='store_true', help="Saída em JSON")
+    args = parser.parse_args(argv)
+
+    diretorio = os.path.join(os.path.dirname(os.path.abspath(__file__)), args.dir)
+    arquivos = sorted(glob.glob(os.path.join(diretorio, '*.html')))
+    if not arquivos:
+        print(f"✗ Nenhuma fixture encontrada em '{diretorio}'")
+        return 1
+
+    resultados = [medir_fonte(caminho, args.repeticoes) for caminho in arquivos]
+
+    if args.json:
+        print(json.dumps(resultados, ensure_ascii=False, indent=2))
+    else:
+        print(f"{'fonte':<16}{'html (KB)':>10}{'alíquotas':>11}{'mediana':>11}{'mín':>10}{'máx':>10}{'pico mem':>12}")
+        print("-" * 80)
+        for r in resultados:
+            print(
+                f"{r['fonte']:<16}{r['tamanho_html_kb']:>10}{r['aliquotas']:>11}"
+                f"{r['mediana_ms']:>9}ms{r['minimo_ms']:>8}ms{r['maximo_ms']:>8}ms{r['pico_memoria_kb']:>9} KB"
+            )
+
+    if args.limite_ms is not None:
+        lentas = [r['fonte'] for r in resultados if r['mediana_ms'] > args.limite_ms]
+        if lentas:
+            print(f"✗ Mediana acima de {args.limite_ms}ms: {', '.join(lentas)}", file=sys.stderr)
+            return 1
+
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,106 @@
+import numpy as np
+from ufs import INDICE_UF
+
+# Códigos de erro por operação retornados pelo cálculo vetorizado
+OK = 0
+ERRO_UF_INVALIDA = 1
+ERRO_MESMO_ESTADO = 2
+ERRO_VALOR_INVALIDO = 3
+ERRO_ALIQUOTA_INTERESTADUAL = 4
+ERRO_ALIQUOTA_INTERNA = 5
+ERRO_VALOR_MAXIMO = 6
+
+# Maior valor_operacao aceito: acima disso os resultados (valor * alíquota,
+# np.round) podem estourar float64 e virar Infinity, que não é JSON válido
+VALOR_OPERACAO_MAXIMO = 1e15
+
+MENSAGENS_ERRO = {
+    ERRO_UF_INVALIDA: "origem e destino devem ser siglas de UF válidas",
+    ERRO_MESMO_ESTADO: "DIFAL não se aplica para operações dentro do mesmo estado",
+    ERRO_VALOR_INVALIDO: "valor_operacao deve ser um número maior que zero",
+    ERRO_ALIQUOTA_INTERESTADUAL: "Alíquota interestadual não encontrada",
+    ERRO_ALIQUOTA_INTERNA: "Alíquota interna do destino não encontrada",
+    ERRO_VALOR_MAXIMO: f"valor_operacao deve ser no máximo {VALOR_OPERACAO_MAXIMO:.0e}"
+}
+
+
+def indices_ufs(siglas):
+    """Converte uma sequência de siglas em índices (-1 para siglas inválidas)"""
+    siglas = np.asarray(siglas, dtype=str)
+
+    # Mapeia apenas os valores distintos e expande pelo índice inverso
+    unicas, inverso = np.unique(siglas, return_inverse=True)
+    mapeadas = np.array([INDICE_UF.get(uf.upper(), -1) for uf in unicas], dtype=np.intp)
+
+    return mapeadas[inverso.reshape(-1)]
+
+
+def converter_valores(valores):
+    """Converte uma sequência de valores em float64 (NaN para valores não numéricos)"""
+    try:
+        return np.asarray(valores, dtype=np.float64)
+    except (ValueError, TypeError):
+        convertidos = np.empty(len(valores), dtype=np.float64)
+        for i, valor in enumerate(valores):
+            try:
+                convertidos[i] = float(valor)
+            except (ValueError, TypeError):
+                convertidos[i] = np.nan
+        return convertidos
+
+
+def calcular_difal_vetorizado(matriz_array, origens, destinos, valores):
+    """
+    Calcula DIFAL para arrays de operações em uma única passagem
+
+    matriz_array é MatrizAliquotas.valores; origens/destinos são índices de
+    UF (ver ufs.UFS) e valores os valores das operações. A alíquota interna
+    do destino é a diagonal da matriz. Retorna um dicionário de arrays
+    alinhados às operações, incluindo 'erro' com o código de erro de cada
+    linha (OK quando válida).
+    """
+    total_ufs = matriz_array.shape[0]
+    origens = np.asarray(origens, dtype=np.intp)
+    destinos = np.asarray(destinos, dtype=np.intp)
+    valores = np.asarray(valores, dtype=np.float64)
+
+    ufs_validas = (origens >= 0) & (origens < total_ufs) & (destinos >= 0) & (destinos < total_ufs)
+    o = np.where(ufs_validas, origens, 0)
+    d = np.where(ufs_validas, destinos, 0)
+
+    aliquota_interestadual = np.where(ufs_validas, matriz_array[o, d], np.nan)
+    aliquota_interna = np.where(ufs_validas, np.diagonal(matriz_array)[d], np.nan)
+
+    diferencial = aliquota_interna - aliquota_interestadual
+    # Valores fora do limite não entram na conta (evita overflow; a linha vira erro)
+    fator = np.where(valores <= VALOR_OPERACAO_MAXIMO, valores, np.nan) / 100
+
+    erro = np.select(
+        [
+            ~ufs_validas,
+            origens == destinos,
+            ~(np.isfinite(valores) & (valores > 0)),
+            valores > VALOR_OPERACAO_MAXIMO,
+            np.isnan(aliquota_interestadual),
+            np.isnan(aliquota_interna)
+        ],
+        [
+            ERRO_UF_INVALIDA,
+            ERRO_MESMO_ESTADO,
+            ERRO_VALOR_INVALIDO,
+            ERRO_VALOR_MAXIMO,
+            ERRO_ALIQUOTA_INTERESTADUAL,
+            ERRO_ALIQUOTA_INTERNA
+        ],
+        default=OK
+    ).astype(np.int8)
+
+    return {
+        'aliquota_interestadual': aliquota_interestadual,
+        'aliquota_interna_destino': aliquota_interna,
+        'diferencial_aliquota': np.round(diferencial, 2),
+        'valor_difal': np.round(fator * diferencial, 2),
+        'valor_icms_origem': np.round(fator * aliquota_interestadual, 2),
+        'valor_icms_total': np.round(fator * aliquota_interna, 2),
+        'erro': erro
+    }
@@ -1,4 +1,5 @@
 import os
+import tempfile
 from dotenv import load_dotenv
 
 load_dotenv()
@@ -9,6 +10,86 @@ class Config:
     FLASK_ENV = os.getenv('FLASK_ENV', 'development')
     FLASK_PORT = int(os.getenv('FLASK_PORT', 5004))
 
+    # Importação: lotes de UPSERT enviados em paralelo, com novas tentativas
+    IMPORT_TAMANHO_LOTE = int(os.getenv('IMPORT_TAMANHO_LOTE', 50))
+    IMPORT_WORKERS = int(os.getenv('IMPORT_WORKERS', 4))
+    IMPORT_TENTATIVAS = int(os.getenv('IMPORT_TENTATIVAS', 3))
+    IMPORT_ESPERA_INICIAL = float(os.getenv('IMPORT_ESPERA_INICIAL', 0.5))
+
+    # Diretório compartilhado entre workers com o lock e o status das atualizações
+    ATUALIZACAO_DIR = os.getenv('ATUALIZACAO_DIR', os.path.join(tempfile.gettempdir(), 'icms_atualizacao'))
+
+    # Agendador interno de atualização (segundos; 0 desativa), com jitter e
+    # intervalo de verificação de atualizações concluídas por outros workers
+    AGENDADOR_INTERVALO = int(os.getenv('AGENDADOR_INTERVALO', 0))
+    AGENDADOR_JITTER = int(os.getenv('AGENDADOR_JITTER', 300))
+    AGENDADOR_VERIFICACAO = int(os.getenv('AGENDADOR_VERIFICACAO', 30))
+
+    # Timeout (segundos) do download direto das fontes, sem navegador
+    SCRAPING_TIMEOUT_HTTP = int(os.getenv('SCRAPING_TIMEOUT_HTTP', 15))
+
+    # Espera máxima (segundos) pela tabela completa nas fontes com navegador
+    SCRAPING_ESPERA_MAXIMA = int(os.getenv('SCRAPING_ESPERA_MAXIMA', 20))
+
+    # Prazo total (segundos) de cada fonte no scraping paralelo
+    SCRAPING_TIMEOUT_FONTE = int(os.getenv('SCRAPING_TIMEOUT_FONTE', 90))
+
+    # Não abre o Chrome para uma fonte sem tabela no HTML estático se outra
+    # fonte já trouxe por HTTP a tabela completa (27x27). Desativado por
+    # padrão: a fonte ignorada deixa de contribuir com as alíquotas internas
+    # (o SVRS é a fonte prioritária delas)
+    SCRAPING_PULAR_NAVEGADOR_SE_COMPLETA = os.getenv('SCRAPING_PULAR_NAVEGADOR_SE_COMPLETA', 'false').lower() == 'true'
+
+    # Bloqueio de imagens, fontes, CSS e scripts de terceiros no navegador,
+    # com padrões extras de URL separados por vírgula
+    SCRAPING_BLOQUEAR_RECURSOS = os.getenv('SCRAPING_BLOQUEAR_RECURSOS', 'true').lower() == 'true'
+    SCRAPING_URLS_BLOQUEADAS = [
+        padrao.strip() for padrao in os.getenv('SCRAPING_URLS_BLOQUEADAS', '').split(',') if padrao.strip()
+    ]
+
+    # Pool de navegadores aquecidos (por processo): máximo aberto (0: um por
+    # fonte do scraper), usos até reciclar, limite de heap JavaScript (MB;
+    # 0 desativa), espera por um navegador livre e tempo ocioso até fechar
+    # um navegador livre (0 mantém)
+    NAVEGADOR_POOL_TAMANHO = int(os.getenv('NAVEGADOR_POOL_TAMANHO', 0))
+    NAVEGADOR_MAX_USOS = int(os.getenv('NAVEGADOR_MAX_USOS', 20))
+    NAVEGADOR_MAX_MEMORIA_MB = int(os.getenv('NAVEGADOR_MAX_MEMORIA_MB', 512))
+    NAVEGADOR_ESPERA_POOL = int(os.getenv('NAVEGADOR_ESPERA_POOL', 60))
+    NAVEGADOR_OCIOSO_SEGUNDOS = int(os.getenv('NAVEGADOR_OCIOSO_SEGUNDOS', 600))
+
+    # Validadores por fonte (ETag/Last-Modified/hash da tabela) para pular
+    # atualizações sem mudança (vazio desativa)
+    SCRAPING_VALIDADORES_ARQUIVO = os.getenv(
+        'SCRAPING_VALIDADORES_ARQUIVO', os.path.join(ATUALIZACAO_DIR, 'validadores_fontes.json')
+    )
+
+    # Fixtures HTML das fontes: 'gravar' salva as páginas obtidas e
+    # 'reproduzir' lê as páginas gravadas, sem rede nem navegador (vazio: normal)
+    SCRAPING_FIXTURES_MODO = os.getenv('SCRAPING_FIXTURES_MODO', '').lower()
+    SCRAPING_FIXTURES_DIR = os.getenv('SCRAPING_FIXTURES_DIR', 'fixtures')
+
+    # Diretório para guardar o JSON de cada scraping (vazio: não grava arquivo)
+    SCRAPING_ARTEFATOS_DIR = os.getenv('SCRAPING_ARTEFATOS_DIR', '')
+
+    # Servidor WSGI de produção (gunicorn.conf.py / serve.py)
+    WSGI_HOST = os.getenv('WSGI_HOST', '0.0.0.0')
+    WSGI_WORKERS = int(os.getenv('WSGI_WORKERS', (os.cpu_count() or 1) * 2 + 1))
+    WSGI_THREADS = int(os.getenv('WSGI_THREADS', 4))
+    WSGI_TIMEOUT = int(os.getenv('WSGI_TIMEOUT', 120))
+    WSGI_GRACEFUL_TIMEOUT = int(os.getenv('WSGI_GRACEFUL_TIMEOUT', 30))
+
+    # Snapshot em memória das alíquotas (segundos entre recargas; 0 desativa)
+    SNAPSHOT_INTERVALO = int(os.getenv('SNAPSHOT_INTERVALO', 300))
+
+    # Cópia local do snapshot para aquecer a API antes de o banco responder (vazio desativa)
+    SNAPSHOT_ARQUIVO = os.getenv('SNAPSHOT_ARQUIVO', 'snapshot_aliquotas.json')
+
+    # Limite de operações por requisição nos cálculos em lote
+    LOTE_MAX_OPERACOES = int(os.getenv('LOTE_MAX_OPERACOES', 500000))
+
+    # Tamanho (bytes) dos blocos enviados pelo cálculo em streaming
+    STREAM_TAMANHO_BLOCO = int(os.getenv('STREAM_TAMANHO_BLOCO', 65536))
+
     @staticmethod
     def validate():
         """Valida se as configurações necessárias estão presentes"""
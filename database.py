@@ -1,65 +1,157 @@
-from supabase import create_client, Client
 from config import Config
+from matriz_aliquotas import MatrizAliquotas
+from ufs import UFS, INDICE_UF
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 import json
+import random
+import time
+import numpy as np
 
 class SupabaseDB:
     def __init__(self):
         Config.validate()
         print("🔌 Conectando ao Supabase...")
         print(f"  - SUPABASE_URL: {Config.SUPABASE_URL}")
-        self.client: Client = create_client(Config.SUPABASE_URL, Config.SUPABASE_KEY)
+        self.client = self._criar_cliente()
         print("✅ Cliente Supabase inicializado")
     
+    @staticmethod
+    def _criar_cliente():
+        """Cria o cliente Supabase (import adiado para não pesar no import do módulo)"""
+        from supabase import create_client
+        return create_client(Config.SUPABASE_URL, Config.SUPABASE_KEY)
+    
+    def reconectar(self):
+        """Recria o cliente HTTP (ex.: em cada worker após o fork do gunicorn)"""
+        self.client = self._criar_cliente()
+    
     def inserir_aliquotas_internas(self, aliquotas_dict, fonte='conta_azul'):
-        """Insere ou atualiza alíquotas internas"""
-        registros_inseridos = 0
+        """
+        Insere ou atualiza alíquotas internas
+
+        Todas as UFs são gravadas em uma única chamada à função
+        substituir_aliquotas_internas (schema.sql), que desativa os registros
+        antigos e insere os novos na mesma transação. Em bancos que ainda não
+        receberam a função (migrations/002), usa update + insert.
+        """
         erros = []
+        registros = []
         
         print(f"\n📝 Inserindo {len(aliquotas_dict)} alíquotas internas...")
         
         for uf, aliquota in aliquotas_dict.items():
             try:
-                print(f"  Processando {uf}: {aliquota}%")
+                registros.append({'uf': uf, 'aliquota': float(aliquota)})
+            except (ValueError, TypeError):
+                erro_msg = f"Erro ao inserir {uf}: alíquota inválida '{aliquota}'"
+                erros.append(erro_msg)
+                print(f"    ❌ {erro_msg}")
+        
+        if not registros:
+            return 0, erros
+        
+        try:
+            try:
+                result = self.client.rpc('substituir_aliquotas_internas', {
+                    'p_registros': registros,
+                    'p_fonte': fonte
+                }).execute()
                 
-                # Desativa registros antigos
-                try:
-                    result = self.client.table('aliquotas_internas').update({
-                        'ativo': False
-                    }).eq('uf', uf).eq('ativo', True).execute()
-                    print(f"    ↳ Desativados registros antigos: {len(result.data) if result.data else 0}")
-                except Exception as e:
-                    print(f"    ⚠️ Aviso ao desativar: {e}")
+                registros_inseridos = result.data if isinstance(result.data, int) else len(registros)
+            except Exception as e:
+                if not self._funcao_ausente(e):
+                    raise
                 
-                # Insere novo registro (SEM data_extracao)
-                data = {
-                    'uf': uf,
-                    'aliquota': float(aliquota),
-                    'fonte': fonte,
-                    'ativo': True
-                }
+                print("    ⚠️ Função substituir_aliquotas_internas ausente no banco (execute migrations/); usando update/insert")
+                registros_inseridos = self._substituir_aliquotas_internas_sem_rpc(registros, fonte)
+        except Exception as e:
+            erro_msg = f"Erro ao substituir alíquotas internas: {str(e)}"
+            erros.append(erro_msg)
+            print(f"    ❌ {erro_msg}")
+            return 0, erros
+        
+        print(f"\n✅ Total inserido: {registros_inseridos}/{len(aliquotas_dict)}")
+        return registros_inseridos, erros
+    
+    @staticmethod
+    def _funcao_ausente(erro):
+        """True se o erro do PostgREST indica que a função RPC não existe no banco"""
+        return getattr(erro, 'code', None) in ('PGRST202', '42883')
+    
+    def _substituir_aliquotas_internas_sem_rpc(self, registros, fonte):
+        """
+        Caminho anterior à função substituir_aliquotas_internas: desativa os
+        registros ativos das UFs e insere os novos (duas chamadas, sem transação)
+        """
+        ufs = [registro['uf'] for registro in registros]
+        
+        self.client.table('aliquotas_internas').update({
+            'ativo': False
+        }).in_('uf', ufs).eq('ativo', True).execute()
+        
+        result = self.client.table('aliquotas_internas').insert([
+            dict(registro, fonte=fonte, ativo=True) for registro in registros
+        ]).execute()
+        
+        return len(result.data) if result.data else 0
+    
+    def _gravar_lote(self, batch_num, total_batches, batch):
+        """Faz o UPSERT de um lote, com novas tentativas e espera exponencial"""
+        inicio = time.monotonic()
+        erro_msg = None
+        tentativa = 0
+        
+        for tentativa in range(1, Config.IMPORT_TENTATIVAS + 1):
+            try:
+                print(f"  📤 Processando lote {batch_num}/{total_batches} ({len(batch)} registros, tentativa {tentativa})...")
                 
-                result = self.client.table('aliquotas_internas').insert(data).execute()
+                # Tenta UPSERT (atualiza se existe, insere se não existe)
+                result = self.client.table('aliquotas_interestaduais').upsert(
+                    batch,
+                    on_conflict='uf_origem,uf_destino'  # Coluna(s) da constraint única
+                ).execute()
                 
-                if result.data:
-                    registros_inseridos += 1
-                    print(f"    ✅ Inserido com sucesso")
+                num_records = len(result.data) if result.data else 0
+                if num_records:
+                    print(f"    ✅ Lote {batch_num} processado: {num_records} registros")
                 else:
-                    print(f"    ⚠️ Nenhum dado retornado na inserção")
+                    print(f"    ⚠️ Lote {batch_num} não retornou dados")
                 
+                return {
+                    'lote': batch_num,
+                    'registros': len(batch),
+                    'gravados': num_records,
+                    'tentativas': tentativa,
+                    'duracao_segundos': round(time.monotonic() - inicio, 3),
+                    'erro': None
+                }
             except Exception as e:
-                erro_msg = f"Erro ao inserir {uf}: {str(e)}"
-                erros.append(erro_msg)
+                erro_msg = f"Erro no lote {batch_num}: {str(e)}"
                 print(f"    ❌ {erro_msg}")
+                
+                if tentativa < Config.IMPORT_TENTATIVAS:
+                    espera = Config.IMPORT_ESPERA_INICIAL * 2 ** (tentativa - 1)
+                    time.sleep(espera + random.uniform(0, espera / 2))
         
-        print(f"\n✅ Total inserido: {registros_inseridos}/{len(aliquotas_dict)}")
-        return registros_inseridos, erros
+        return {
+            'lote': batch_num,
+            'registros': len(batch),
+            'gravados': 0,
+            'tentativas': tentativa,
+            'duracao_segundos': round(time.monotonic() - inicio, 3),
+            'erro': erro_msg
+        }
     
-    def inserir_aliquotas_interestaduais(self, matriz_dict, fonte='conta_azul'):
-        """Insere ou atualiza alíquotas interestaduais em lote usando UPSERT"""
-        registros_inseridos = 0
-        registros_atualizados = 0
-        erros = []
+    def inserir_aliquotas_interestaduais(self, matriz_dict, fonte='conta_azul', batch_size=None, max_workers=None):
+        """
+        Insere ou atualiza alíquotas interestaduais em lote usando UPSERT
+
+        Os lotes são enviados em paralelo por um pool limitado de threads.
+        Retorna (registros gravados, erros, resultado de cada lote).
+        """
+        batch_size = batch_size or Config.IMPORT_TAMANHO_LOTE
+        max_workers = max_workers or Config.IMPORT_WORKERS
         
         # Conta total de registros
         total_registros = sum(len(destinos) for destinos in matriz_dict.values())
@@ -79,78 +171,247 @@ class SupabaseDB:
         
         print(f"  📦 Preparados {len(registros)} registros para UPSERT")
         
-        # Processa em lotes de 50 registros (reduzido para melhor controle)
-        batch_size = 50
         total_batches = (len(registros) + batch_size - 1) // batch_size
+        lotes = [
+            (i // batch_size + 1, registros[i:i + batch_size])
+            for i in range(0, len(registros), batch_size)
+        ]
         
-        for i in range(0, len(registros), batch_size):
-            batch = registros[i:i + batch_size]
-            batch_num = i // batch_size + 1
-            
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            resultados = list(executor.map(
+                lambda lote: self._gravar_lote(lote[0], total_batches, lote[1]),
+                lotes
+            ))
+        
+        registros_inseridos = sum(r['gravados'] for r in resultados)
+        erros = [r['erro'] for r in resultados if r['erro']]
+        
+        print(f"\n✅ Total processado: {registros_inseridos}/{len(registros)}")
+        return registros_inseridos, erros, resultados
+        
+    def obter_aliquotas_ativas(self):
+        """
+        Retorna as alíquotas ativas como MatrizAliquotas (interestaduais e internas)
+
+        Propaga exceções: sem a leitura não é possível calcular as diferenças.
+        """
+        interestaduais = self.client.table('aliquotas_interestaduais').select(
+            'uf_origem, uf_destino, aliquota'
+        ).eq('ativo', True).order('created_at').execute()
+        
+        internas = self.client.table('aliquotas_internas').select(
+            'uf, aliquota'
+        ).eq('ativo', True).order('created_at').execute()
+        
+        matriz = MatrizAliquotas()
+        for registro in interestaduais.data or []:
+            matriz.definir(registro['uf_origem'], registro['uf_destino'], float(registro['aliquota']))
+        for item in internas.data or []:
+            matriz.definir_interna(item['uf'], float(item['aliquota']))
+        
+        return matriz
+    
+    def calcular_alteracoes(self, matriz_dict, aliquotas_dict):
+        """
+        Compara os dados extraídos com as alíquotas ativas no banco
+
+        Pares ausentes do scraping só são considerados removidos quando a
+        linha da origem e a coluna do destino foram extraídas; uma linha ou
+        coluna inteira faltando (ex.: UF ausente no cabeçalho) indica falha
+        de extração e mantém os dados atuais. Alíquotas internas nunca são
+        removidas pelo mesmo motivo. Células inválidas são reportadas como
+        erro e também mantêm o valor atual.
+        """
+        atual = self.obter_aliquotas_ativas()
+        nova = MatrizAliquotas.de_dicionario(matriz_dict, aliquotas_dict)
+        
+        alteracoes = {
+            'interestaduais': {'inseridas': [], 'alteradas': [], 'removidas': []},
+            'internas': {'inseridas': [], 'alteradas': []},
+            'erros': []
+        }
+        
+        for (uf_origem, uf_destino), aliquota in nova.invalidas.items():
+            if uf_destino is None:
+                alteracoes['erros'].append(f"Alíquota interna inválida {uf_origem}: '{aliquota}'")
+            else:
+                alteracoes['erros'].append(
+                    f"Alíquota inválida {uf_origem} → {uf_destino}: '{aliquota}'"
+                )
+        
+        # Comparação célula a célula sobre os arrays 27x27
+        novos = np.round(nova.valores, 2)
+        anteriores = atual.valores
+        tem_novo = ~np.isnan(novos)
+        tem_anterior = ~np.isnan(anteriores)
+        
+        origens_extraidas = np.zeros(len(UFS), dtype=bool)
+        destinos_extraidos = np.zeros(len(UFS), dtype=bool)
+        for uf_origem, destinos in matriz_dict.items():
+            if uf_origem in INDICE_UF:
+                origens_extraidas[INDICE_UF[uf_origem]] = True
+            for uf_destino in destinos:
+                if uf_destino in INDICE_UF:
+                    destinos_extraidos[INDICE_UF[uf_destino]] = True
+        extraidas = origens_extraidas[:, None] & destinos_extraidos[None, :]
+        invalidas = np.zeros_like(tem_novo)
+        for uf_origem, uf_destino in nova.invalidas:
+            if uf_origem in INDICE_UF and uf_destino in INDICE_UF:
+                invalidas[INDICE_UF[uf_origem], INDICE_UF[uf_destino]] = True
+        
+        for i, j in zip(*np.nonzero(tem_novo & ~tem_anterior)):
+            alteracoes['interestaduais']['inseridas'].append({
+                'origem': UFS[i], 'destino': UFS[j], 'aliquota': float(novos[i, j])
+            })
+        for i, j in zip(*np.nonzero(tem_novo & tem_anterior & (np.round(anteriores, 2) != novos))):
+            alteracoes['interestaduais']['alteradas'].append({
+                'origem': UFS[i], 'destino': UFS[j],
+                'aliquota_anterior': float(anteriores[i, j]), 'aliquota': float(novos[i, j])
+            })
+        for i, j in zip(*np.nonzero(extraidas & tem_anterior & ~tem_novo & ~invalidas)):
+            alteracoes['interestaduais']['removidas'].append({
+                'origem': UFS[i], 'destino': UFS[j], 'aliquota_anterior': float(anteriores[i, j])
+            })
+        
+        internas_novas = np.round(nova.internas, 2)
+        internas_anteriores = atual.internas
+        tem_nova = ~np.isnan(internas_novas)
+        tem_anterior = ~np.isnan(internas_anteriores)
+        
+        for i in np.flatnonzero(tem_nova & ~tem_anterior):
+            alteracoes['internas']['inseridas'].append({'uf': UFS[i], 'aliquota': float(internas_novas[i])})
+        for i in np.flatnonzero(tem_nova & tem_anterior & (np.round(internas_anteriores, 2) != internas_novas)):
+            alteracoes['internas']['alteradas'].append({
+                'uf': UFS[i], 'aliquota_anterior': float(internas_anteriores[i]), 'aliquota': float(internas_novas[i])
+            })
+        
+        return alteracoes
+    
+    def desativar_aliquotas_interestaduais(self, pares):
+        """Desativa pares (origem, destino) removidos da fonte, um UPDATE por estado de origem"""
+        por_origem = {}
+        for uf_origem, uf_destino in pares:
+            por_origem.setdefault(uf_origem, []).append(uf_destino)
+        
+        total_desativados = 0
+        erros = []
+        
+        for uf_origem, destinos in por_origem.items():
             try:
-                print(f"  📤 Processando lote {batch_num}/{total_batches} ({len(batch)} registros)...")
-                
-                # Tenta UPSERT (atualiza se existe, insere se não existe)
-                result = self.client.table('aliquotas_interestaduais').upsert(
-                    batch,
-                    on_conflict='uf_origem,uf_destino'  # Coluna(s) da constraint única
-                ).execute()
-                
-                if result.data:
-                    num_records = len(result.data)
-                    registros_inseridos += num_records
-                    print(f"    ✅ Lote {batch_num} processado: {num_records} registros")
-                else:
-                    print(f"    ⚠️ Lote {batch_num} não retornou dados")
-                    
+                result = self.client.table('aliquotas_interestaduais').update({
+                    'ativo': False
+                }).eq('uf_origem', uf_origem).in_('uf_destino', destinos).eq('ativo', True).execute()
+                total_desativados += len(result.data) if result.data else 0
             except Exception as e:
-                erro_msg = f"Erro no lote {batch_num}: {str(e)}"
+                erro_msg = f"Erro ao desativar alíquotas de {uf_origem}: {str(e)}"
                 erros.append(erro_msg)
                 print(f"    ❌ {erro_msg}")
         
-        print(f"\n✅ Total processado: {registros_inseridos}/{len(registros)}")
-        return registros_inseridos, erros
-        
-    def importar_json(self, json_path):
+        return total_desativados, erros
+    
+    def importar_json(self, json_path, completo=False):
         """Importa dados do JSON gerado pelo scraper"""
-        print(f"\n{'='*70}")
-        print(f"📥 IMPORTANDO DADOS DO JSON: {json_path}")
-        print(f"{'='*70}")
-        
         try:
             # Lê o arquivo JSON
-            print(f"\n📖 Lendo arquivo JSON...")
+            print(f"\n📖 Lendo arquivo JSON: {json_path}")
             with open(json_path, 'r', encoding='utf-8') as f:
                 dados = json.load(f)
-            
-            print(f"✅ Arquivo lido com sucesso")
+        except Exception as e:
+            print(f"\n❌ ERRO ao ler o arquivo JSON: {str(e)}")
+            return {
+                'sucesso': False,
+                'erro': str(e)
+            }
+        
+        return self.importar_dados(dados, completo, origem=json_path)
+    
+    def importar_dados(self, dados, completo=False, origem='memória'):
+        """
+        Importa dados no formato de ICMS_Scraper.get_dados_completos()
+
+        Por padrão grava apenas as alíquotas inseridas, alteradas ou removidas
+        em relação ao banco; completo=True regrava todas.
+        """
+        print(f"\n{'='*70}")
+        print(f"📥 IMPORTANDO DADOS ({origem})")
+        print(f"{'='*70}")
+        
+        inicio = time.monotonic()
+        fonte = 'desconhecida'
+        data_extracao = datetime.now().isoformat()
+        
+        try:
             print(f"  - Estados com alíquotas internas: {len(dados['aliquotas_internas'])}")
             print(f"  - Estados na matriz: {len(dados['matriz_interestadual'])}")
             
             fonte = dados['metadata']['fontes_utilizadas'][0] if dados['metadata']['fontes_utilizadas'] else 'desconhecida'
+            data_extracao = dados['metadata'].get('data_extracao') or data_extracao
             print(f"  - Fonte: {fonte}")
             
+            alteracoes = None
+            erros_alteracoes = []
+            total_removidas = 0
+            
+            if completo:
+                internas_para_gravar = dados['aliquotas_internas']
+                matriz_para_gravar = dados['matriz_interestadual']
+            else:
+                print(f"\n🔍 Comparando com as alíquotas ativas no banco...")
+                alteracoes = self.calcular_alteracoes(
+                    dados['matriz_interestadual'],
+                    dados['aliquotas_internas']
+                )
+                erros_alteracoes = alteracoes['erros']
+                
+                internas_para_gravar = {
+                    item['uf']: item['aliquota']
+                    for tipo in ('inseridas', 'alteradas')
+                    for item in alteracoes['internas'][tipo]
+                }
+                matriz_para_gravar = {}
+                for tipo in ('inseridas', 'alteradas'):
+                    for item in alteracoes['interestaduais'][tipo]:
+                        matriz_para_gravar.setdefault(item['origem'], {})[item['destino']] = item['aliquota']
+                
+                removidas = alteracoes['interestaduais']['removidas']
+                print(f"  - Internas: {len(internas_para_gravar)} a gravar")
+                print(f"  - Interestaduais: {sum(len(d) for d in matriz_para_gravar.values())} a gravar, {len(removidas)} a desativar")
+                
+                if removidas:
+                    total_removidas, erros_remocao = self.desativar_aliquotas_interestaduais(
+                        [(item['origem'], item['destino']) for item in removidas]
+                    )
+                    erros_alteracoes = erros_alteracoes + erros_remocao
+            
             # Insere alíquotas internas
-            total_internas, erros_internas = self.inserir_aliquotas_internas(
-                dados['aliquotas_internas'], 
-                fonte
-            )
+            total_internas, erros_internas = (0, [])
+            if internas_para_gravar:
+                total_internas, erros_internas = self.inserir_aliquotas_internas(
+                    internas_para_gravar, 
+                    fonte
+                )
             
             # Insere alíquotas interestaduais
-            total_inter, erros_inter = self.inserir_aliquotas_interestaduais(
-                dados['matriz_interestadual'],
-                fonte
-            )
+            total_inter, erros_inter, lotes = (0, [], [])
+            if matriz_para_gravar:
+                total_inter, erros_inter, lotes = self.inserir_aliquotas_interestaduais(
+                    matriz_para_gravar,
+                    fonte
+                )
             
-            total_registros = total_internas + total_inter
-            todos_erros = erros_internas + erros_inter
+            total_registros = total_internas + total_inter + total_removidas
+            todos_erros = erros_alteracoes + erros_internas + erros_inter
             
             print(f"\n{'='*70}")
             print(f"📊 RESUMO DA IMPORTAÇÃO")
             print(f"{'='*70}")
             print(f"✅ Alíquotas internas: {total_internas}")
             print(f"✅ Alíquotas interestaduais: {total_inter}")
+            if total_removidas:
+                print(f"✅ Alíquotas interestaduais desativadas: {total_removidas}")
             print(f"✅ Total de registros: {total_registros}")
+            if total_registros == 0 and not todos_erros:
+                print(f"ℹ️ Nenhuma alteração em relação aos dados ativos")
             
             if todos_erros:
                 print(f"\n⚠️ Erros encontrados: {len(todos_erros)}")
@@ -161,11 +422,34 @@ class SupabaseDB:
             
             print(f"{'='*70}\n")
             
+            # Estatísticas calculadas uma vez por importação
+            estatisticas = {
+                'total_estados': len(dados['matriz_interestadual']),
+                'total_aliquotas_internas': len(dados['aliquotas_internas']),
+                'total_aliquotas_interestaduais': sum(
+                    len(destinos) for destinos in dados['matriz_interestadual'].values()
+                )
+            }
+            
+            self.registrar_atualizacao(
+                fonte,
+                'parcial' if todos_erros else 'sucesso',
+                total_registros,
+                data_extracao,
+                time.monotonic() - inicio,
+                estatisticas,
+                mensagem=f"{len(todos_erros)} erros" if todos_erros else None
+            )
+            
             return {
                 'sucesso': True,
                 'total_registros': total_registros,
                 'total_internas': total_internas,
                 'total_interestaduais': total_inter,
+                'total_removidas': total_removidas,
+                'alteracoes': alteracoes,
+                'lotes': lotes,
+                'estatisticas': estatisticas,
                 'erros': todos_erros
             }
             
@@ -174,18 +458,67 @@ class SupabaseDB:
             import traceback
             traceback.print_exc()
             
+            self.registrar_atualizacao(
+                fonte,
+                'erro',
+                0,
+                data_extracao,
+                time.monotonic() - inicio,
+                mensagem=str(e)
+            )
+            
             return {
                 'sucesso': False,
                 'erro': str(e)
             }
     
+    def registrar_atualizacao(self, fonte, status, total_registros, data_extracao,
+                              duracao, estatisticas=None, mensagem=None):
+        """Registra uma importação em historico_atualizacoes"""
+        estatisticas = estatisticas or {}
+        
+        try:
+            self.client.table('historico_atualizacoes').insert({
+                'fonte': fonte,
+                'status': status,
+                'total_registros_inseridos': total_registros,
+                'total_estados': estatisticas.get('total_estados'),
+                'total_aliquotas_internas': estatisticas.get('total_aliquotas_internas'),
+                'total_aliquotas_interestaduais': estatisticas.get('total_aliquotas_interestaduais'),
+                'duracao_segundos': round(duracao, 3),
+                'mensagem': mensagem,
+                'data_extracao': data_extracao
+            }).execute()
+        except Exception as e:
+            print(f"⚠️ Erro ao registrar histórico de atualização: {e}")
+    
+    def obter_ultima_atualizacao(self):
+        """Retorna o registro da última importação bem-sucedida (ou None)"""
+        try:
+            response = self.client.table('historico_atualizacoes').select(
+                'fonte, status, total_estados, total_aliquotas_internas, '
+                'total_aliquotas_interestaduais, duracao_segundos, data_extracao, created_at'
+            ).in_('status', ['sucesso', 'parcial']).order('created_at', desc=True).limit(1).execute()
+            
+            return response.data[0] if response.data else None
+        except Exception as e:
+            print(f"❌ Erro ao obter última atualização: {e}")
+            return None
+    
     def consultar_aliquota(self, uf_origem, uf_destino):
         """Consulta alíquota entre dois estados"""
+        uf_origem = uf_origem.upper()
+        uf_destino = uf_destino.upper()
+        
+        # UFs fora das 27 canônicas nunca chegam ao Supabase
+        if uf_origem not in INDICE_UF or uf_destino not in INDICE_UF:
+            return None
+        
         try:
             response = self.client.table('aliquotas_interestaduais').select('*').eq(
-                'uf_origem', uf_origem.upper()
+                'uf_origem', uf_origem
             ).eq(
-                'uf_destino', uf_destino.upper()
+                'uf_destino', uf_destino
             ).eq(
                 'ativo', True
             ).order('created_at', desc=True).limit(1).execute()
@@ -211,28 +544,50 @@ class SupabaseDB:
             return []
     
     def obter_matriz_completa(self):
-        """Retorna a matriz completa de alíquotas"""
+        """
+        Retorna a matriz completa de alíquotas como MatrizAliquotas
+
+        Use para_dicionario() / para_lista() para os formatos JSON.
+        """
         try:
             response = self.client.table('aliquotas_interestaduais').select(
                 'uf_origem, uf_destino, aliquota'
-            ).eq('ativo', True).execute()
+            ).eq('ativo', True).order('created_at').execute()
             
-            # Organiza em formato de matriz
-            matriz = {}
+            matriz = MatrizAliquotas()
             for registro in response.data:
-                origem = registro['uf_origem']
-                destino = registro['uf_destino']
-                aliquota = registro['aliquota']
-                
-                if origem not in matriz:
-                    matriz[origem] = {}
-                
-                matriz[origem][destino] = float(aliquota)
+                matriz.definir(registro['uf_origem'], registro['uf_destino'], float(registro['aliquota']))
             
             return matriz
         except Exception as e:
             print(f"❌ Erro ao obter matriz completa: {e}")
-            return {}
+            return MatrizAliquotas()
+
+    def obter_dados_snapshot(self):
+        """
+        Carrega todas as alíquotas ativas para o snapshot em memória
+
+        Diferente das demais consultas, propaga exceções para que uma falha
+        de conexão não substitua o snapshot atual por dados vazios.
+        """
+        interestaduais = self.client.table('aliquotas_interestaduais').select(
+            'uf_origem, uf_destino, aliquota, fonte'
+        ).eq('ativo', True).order('created_at').execute()
+
+        internas = self.client.table('aliquotas_internas').select(
+            'uf, aliquota, fonte'
+        ).eq('ativo', True).order('uf').execute()
+
+        estados = self.client.table('estados').select(
+            'uf, nome, regiao'
+        ).order('uf').execute()
+
+        return {
+            'interestaduais': interestaduais.data or [],
+            'internas': internas.data or [],
+            'estados': estados.data or [],
+            'ultima_atualizacao': self.obter_ultima_atualizacao()
+        }
 
     def listar_estados(self):
         """Lista todos os estados cadastrados"""
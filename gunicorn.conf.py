@@ -0,0 +1,48 @@
+"""
+Configuração do gunicorn para produção
+
+Uso: gunicorn -c gunicorn.conf.py api:app
+
+A aplicação (e o snapshot de alíquotas) é carregada uma única vez no
+processo master; os workers herdam os dados por copy-on-write.
+"""
+import gc
+from config import Config
+
+bind = f"{Config.WSGI_HOST}:{Config.FLASK_PORT}"
+workers = Config.WSGI_WORKERS
+threads = Config.WSGI_THREADS
+worker_class = 'gthread'
+timeout = Config.WSGI_TIMEOUT
+graceful_timeout = Config.WSGI_GRACEFUL_TIMEOUT
+keepalive = 5
+
+# Carrega api.py (e o snapshot) no master antes do fork
+preload_app = True
+
+accesslog = '-'
+errorlog = '-'
+
+
+def when_ready(server):
+    """Carrega o snapshot no master e congela os objetos para o GC não tocar nas páginas compartilhadas"""
+    from api import snapshot
+    snapshot.carregar()
+    gc.freeze()
+    server.log.info(f"🚀 API pronta com {workers} workers x {threads} threads")
+
+
+def post_fork(server, worker):
+    """Cada worker abre suas próprias conexões com o Supabase"""
+    from api import iniciar_agendador, reconectar_db
+    reconectar_db()
+    iniciar_agendador()
+
+
+def worker_exit(server, worker):
+    """Para o agendador, fecha os navegadores e registra o encerramento do worker"""
+    from api import agendador
+    from pool_navegadores import encerrar_pools
+    agendador.parar()
+    encerrar_pools()
+    server.log.info(f"🔒 Worker {worker.pid} encerrado")
@@ -1,222 +1,507 @@
-from selenium import webdriver
-from selenium.webdriver.common.by import By
-from selenium.webdriver.support.ui import WebDriverWait
-from selenium.webdriver.support import expected_conditions as EC
-from selenium.webdriver.chrome.options import Options
+import hashlib
 import json
+import os
+import threading
 import time
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FuturesTimeoutError
+from contextlib import contextmanager
 from datetime import datetime
+from config import Config
+from ufs import UFS
+from matriz_aliquotas import MatrizAliquotas
+from pool_navegadores import obter_pool
+from tabelas_html import extrair_tabelas, ler_matriz_aliquotas
 
 class ICMS_Scraper:
-    UFs = ['AC', 'AL', 'AM', 'AP', 'BA', 'CE', 'DF', 'ES', 'GO', 'MA', 
-        'MT', 'MS', 'MG', 'PA', 'PB', 'PR', 'PE', 'PI', 'RN', 'RS', 
-        'RJ', 'RO', 'RR', 'SC', 'SP', 'SE', 'TO']
+    UFs = list(UFS)
     
-    # Fontes de dados
+    # Fontes de dados, em ordem de preferência para a matriz principal.
+    # Estratégia 'http': baixa o HTML sem navegador e só recorre ao Chrome
+    # se a tabela não vier no HTML estático; 'navegador': página renderizada
+    # por JavaScript, usa o Chrome direto. Com SCRAPING_PULAR_NAVEGADOR_SE_COMPLETA,
+    # o Chrome só é aberto se nenhuma fonte trouxe por HTTP a tabela completa
     FONTES = {
-        'conta_azul': 'https://contaazul.com/blog/tabela-de-aliquota-interestadual/',
-        'svrs': 'https://dfe-portal.svrs.rs.gov.br/Difal/aliquotas'
+        'conta_azul': {
+            'nome': 'Conta Azul',
+            'url': 'https://contaazul.com/blog/tabela-de-aliquota-interestadual/',
+            'estrategia': 'http'
+        },
+        'svrs': {
+            'nome': 'SVRS (Portal DIFAL)',
+            'url': 'https://dfe-portal.svrs.rs.gov.br/Difal/aliquotas',
+            'estrategia': 'http'
+        }
     }
+
+    USER_AGENT = (
+        'Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36 '
+        '(KHTML, like Gecko) Chrome/120.0 Safari/537.36'
+    )
+    
+    # Tabela pronta: ao menos N linhas com ao menos N células cada
+    JS_TABELA_PRONTA = """
+        var tabela = document.querySelector('table');
+        if (!tabela) { return false; }
+        var completas = 0;
+        for (var i = 0; i < tabela.rows.length; i++) {
+            if (tabela.rows[i].cells.length >= arguments[0]) { completas++; }
+        }
+        return completas >= arguments[0];
+    """
     
     def __init__(self, headless=True):
         """
         Inicializa o scraper
+
+        As fontes que precisam do navegador pegam um Chrome emprestado do
+        pool do processo, que fica aquecido entre atualizações.
         """
-        chrome_options = Options()
-        
-        chrome_options.add_argument("--headless")
-        chrome_options.add_argument("--no-sandbox")
-        chrome_options.add_argument("--disable-dev-shm-usage")
-        chrome_options.add_argument("--disable-gpu")
-        chrome_options.add_argument("--window-size=1920,1080")
-        chrome_options.add_argument("--disable-blink-features=AutomationControlled")
-        chrome_options.add_experimental_option("excludeSwitches", ["enable-automation"])
-        chrome_options.add_experimental_option('useAutomationExtension', False)
-
-        self.driver = webdriver.Chrome(options=chrome_options)
+        self.headless = headless
+        self._drivers = {}
+        self._lock_drivers = threading.Lock()
+        self._fontes_abandonadas = set()
+        self._lock_http = threading.Condition()
+        self._http_pendentes = set()
+        self._tabela_completa_http = False
         self.matriz_icms = {}
         self.aliquotas_internas = {}
         self.aliquotas_internas_fontes = {}
         self.fonte_utilizada = []
+        self.metadados_fontes = {}
         self.erros = []
+        self.matriz_aliquotas = MatrizAliquotas()
+        self.sem_alteracao = False
+        self.modo_fixtures = Config.SCRAPING_FIXTURES_MODO
+        # Gravação e reprodução de fixtures sempre leem a página inteira
+        self.validadores = {} if self.modo_fixtures else self._carregar_validadores()
+        self._novos_validadores = {}
+
+    # ----------------------------------------
+    # Fixtures (gravação/reprodução offline das páginas)
+    # ----------------------------------------
+
+    def _caminho_fixture(self, fonte):
+        return os.path.join(Config.SCRAPING_FIXTURES_DIR, f"{fonte}.html")
+
+    def _gravar_fixture(self, fonte, html):
+        """No modo 'gravar', salva o HTML obtido para uso offline"""
+        if self.modo_fixtures != 'gravar':
+            return
+
+        os.makedirs(Config.SCRAPING_FIXTURES_DIR, exist_ok=True)
+        with open(self._caminho_fixture(fonte), 'w', encoding='utf-8') as f:
+            f.write(html)
+
+    def _ler_fixture(self, fonte):
+        """No modo 'reproduzir', lê o HTML gravado em vez de acessar a rede"""
+        with open(self._caminho_fixture(fonte), 'r', encoding='utf-8') as f:
+            return f.read()
+
+    # ----------------------------------------
+    # Validadores das fontes (busca condicional)
+    # ----------------------------------------
+
+    def _carregar_validadores(self):
+        """
+        Validadores da última atualização importada, por fonte
+
+        Só são usados se tiverem o resultado lido naquela execução, para que
+        uma fonte inalterada possa ser reaproveitada sem novo download.
+        """
+        arquivo = Config.SCRAPING_VALIDADORES_ARQUIVO
+        if not arquivo:
+            return {}
 
-    def scrape_conta_azul(self):
-        """Extrai dados da Conta Azul"""
-        print('\n📊 Tentando extrair de Conta Azul...')
-        
         try:
-            self.driver.get(self.FONTES['conta_azul'])
-            time.sleep(5)
+            with open(arquivo, 'r', encoding='utf-8') as f:
+                validadores = json.load(f)
+        except (OSError, ValueError):
+            return {}
 
-            # Encontra a tabela principal
-            tabela = self.driver.find_element(By.TAG_NAME, 'table')
-            
-            # Extrai todas as linhas da tabela
-            all_rows = tabela.find_elements(By.TAG_NAME, 'tr')
-            
-            if len(all_rows) == 0:
-                raise Exception("Nenhuma linha encontrada na tabela")
-            
-            # Primeira linha é o cabeçalho
-            header_row = all_rows[0]
-            header_cells = header_row.find_elements(By.TAG_NAME, 'td')
-            
-            # Se não houver td, tenta th
-            if len(header_cells) == 0:
-                header_cells = header_row.find_elements(By.TAG_NAME, 'th')
-            
-            # Lista de UFs no cabeçalho (pula primeira célula vazia)
-            ufs_destino = [cell.text.strip() for cell in header_cells[1:]]
-            print(f"  Estados de destino encontrados: {len(ufs_destino)}")
-            
-            # Linhas de dados (pula a primeira que é o cabeçalho)
-            rows = all_rows[1:]
-            
-            print(f"  Linhas de dados encontradas: {len(rows)}")
-            
-            matriz_temp = {}
-            aliquotas_internas_temp = {}
-            
-            for row in rows:
-                cells = row.find_elements(By.TAG_NAME, 'td')
-                
-                if len(cells) < 2:
-                    continue
-                
-                # Primeira célula é o estado de origem
-                uf_origem = cells[0].text.strip()
-                
-                if uf_origem not in self.UFs:
-                    continue
-                
-                # Inicializa o dicionário para este estado de origem
-                matriz_temp[uf_origem] = {}
-                
-                # Processa cada célula (alíquota para cada destino)
-                for i, cell in enumerate(cells[1:], start=0):
-                    if i >= len(ufs_destino):
-                        break
-                    
-                    uf_destino = ufs_destino[i]
-                    aliquota_text = cell.text.strip()
-                    
-                    # Tenta converter para número
-                    try:
-                        # Remove % e converte vírgula para ponto
-                        aliquota_limpa = aliquota_text.replace('%', '').replace(',', '.').strip()
-                        aliquota_num = float(aliquota_limpa)
-                        
-                        # Armazena alíquota interna (origem = destino)
-                        if uf_origem == uf_destino:
-                            aliquotas_internas_temp[uf_origem] = aliquota_num
-                        
-                        matriz_temp[uf_origem][uf_destino] = aliquota_num
-                    except ValueError:
-                        # Se não conseguir converter, mantém como texto
-                        matriz_temp[uf_origem][uf_destino] = aliquota_text
-                
-                print(f"  ✓ {uf_origem}: {len(matriz_temp[uf_origem])} alíquotas extraídas")
-
-            self.fonte_utilizada.append('conta_azul')
-            self.aliquotas_internas_fontes['conta_azul'] = aliquotas_internas_temp
-            
-            return matriz_temp, aliquotas_internas_temp
-        
-        except Exception as e:
-            erro_msg = f"Erro ao extrair de Conta Azul: {str(e)}"
-            print(f"  ✗ {erro_msg}")
-            self.erros.append(erro_msg)
-            return None, None
+        return {
+            fonte: validador for fonte, validador in validadores.items()
+            if fonte in self.FONTES and isinstance(validador, dict) and validador.get('resultado')
+        }
+
+    def confirmar_validadores(self):
+        """
+        Grava os validadores desta execução
+
+        Deve ser chamado só depois de os dados serem importados com sucesso;
+        caso contrário, a próxima execução consideraria as fontes inalteradas
+        sem que os dados tivessem chegado ao banco.
+        """
+        arquivo = Config.SCRAPING_VALIDADORES_ARQUIVO
+        if not arquivo or not self._novos_validadores:
+            return
+
+        validadores = dict(self.validadores, **self._novos_validadores)
+        diretorio = os.path.dirname(arquivo)
+        if diretorio:
+            os.makedirs(diretorio, exist_ok=True)
+
+        temporario = f"{arquivo}.{os.getpid()}.tmp"
+        with open(temporario, 'w', encoding='utf-8') as f:
+            json.dump(validadores, f, ensure_ascii=False)
+        os.replace(temporario, arquivo)
+
+    @contextmanager
+    def _driver_fonte(self, fonte):
+        """Empresta um navegador do pool para a fonte durante o bloco"""
+        # Um navegador por fonte mantém o paralelismo quando todas precisam do Chrome
+        tamanho = Config.NAVEGADOR_POOL_TAMANHO or len(self.FONTES)
+        with obter_pool(self.headless, tamanho).emprestar() as driver:
+            with self._lock_drivers:
+                if fonte in self._fontes_abandonadas:
+                    raise Exception("fonte abandonada por tempo esgotado")
+                self._drivers[fonte] = driver
+            try:
+                yield driver
+            finally:
+                with self._lock_drivers:
+                    self._drivers.pop(fonte, None)
+
+    def _fechar_driver(self, fonte):
+        """Encerra o navegador em uso pela fonte (ex.: fonte abandonada), se houver"""
+        with self._lock_drivers:
+            driver = self._drivers.pop(fonte, None)
+        if driver is None:
+            return
 
-    def scrape_svrs(self):
-        """Extrai dados do portal SVRS"""
-        print('\n📊 Tentando extrair de SVRS (Portal DIFAL)...')
-        
         try:
-            self.driver.get(self.FONTES['svrs'])
-            time.sleep(5)
+            driver.quit()
+        except:
+            pass
 
-            # Tenta encontrar a tabela (pode ter estrutura diferente)
-            tabelas = self.driver.find_elements(By.TAG_NAME, 'table')
-            
-            if len(tabelas) == 0:
-                raise Exception("Nenhuma tabela encontrada")
-            
-            # Usa a primeira tabela encontrada
-            tabela = tabelas[0]
-            
-            # Extrai todas as linhas
-            all_rows = tabela.find_elements(By.TAG_NAME, 'tr')
-            
-            if len(all_rows) == 0:
-                raise Exception("Nenhuma linha encontrada na tabela")
-            
-            # Processa de forma similar
-            header_row = all_rows[0]
-            header_cells = header_row.find_elements(By.TAG_NAME, 'td')
-            
-            if len(header_cells) == 0:
-                header_cells = header_row.find_elements(By.TAG_NAME, 'th')
-            
-            ufs_destino = [cell.text.strip() for cell in header_cells[1:]]
-            print(f"  Estados de destino encontrados: {len(ufs_destino)}")
-            
-            rows = all_rows[1:]
-            print(f"  Linhas de dados encontradas: {len(rows)}")
-            
-            matriz_temp = {}
-            aliquotas_internas_temp = {}
-            
-            for row in rows:
-                cells = row.find_elements(By.TAG_NAME, 'td')
-                
-                if len(cells) < 2:
-                    continue
-                
-                uf_origem = cells[0].text.strip()
-                
-                if uf_origem not in self.UFs:
-                    continue
-                
-                matriz_temp[uf_origem] = {}
-                
-                for i, cell in enumerate(cells[1:], start=0):
-                    if i >= len(ufs_destino):
-                        break
-                    
-                    uf_destino = ufs_destino[i]
-                    aliquota_text = cell.text.strip()
-                    
-                    try:
-                        aliquota_limpa = aliquota_text.replace('%', '').replace(',', '.').strip()
-                        aliquota_num = float(aliquota_limpa)
-                        
-                        if uf_origem == uf_destino:
-                            aliquotas_internas_temp[uf_origem] = aliquota_num
-                        
-                        matriz_temp[uf_origem][uf_destino] = aliquota_num
-                    except ValueError:
-                        matriz_temp[uf_origem][uf_destino] = aliquota_text
-                
-                print(f"  ✓ {uf_origem}: {len(matriz_temp[uf_origem])} alíquotas extraídas")
-
-            self.fonte_utilizada.append('svrs')
-            self.aliquotas_internas_fontes['svrs'] = aliquotas_internas_temp
-            
-            return matriz_temp, aliquotas_internas_temp
-        
-        except Exception as e:
-            erro_msg = f"Erro ao extrair de SVRS: {str(e)}"
-            print(f"  ✗ {erro_msg}")
-            self.erros.append(erro_msg)
+    def _baixar_html(self, url, anterior=None):
+        """
+        Baixa o HTML estático da página, sem navegador
+
+        Envia os validadores da última execução (ETag/Last-Modified).
+        Retorna (html, validadores); html é None quando o servidor responde
+        304 (página inalterada).
+        """
+        cabecalhos = {
+            'User-Agent': self.USER_AGENT,
+            'Accept': 'text/html,application/xhtml+xml',
+            'Accept-Language': 'pt-BR,pt;q=0.9'
+        }
+        if anterior:
+            if anterior.get('etag'):
+                cabecalhos['If-None-Match'] = anterior['etag']
+            if anterior.get('last_modified'):
+                cabecalhos['If-Modified-Since'] = anterior['last_modified']
+
+        requisicao = urllib.request.Request(url, headers=cabecalhos)
+        try:
+            with urllib.request.urlopen(requisicao, timeout=Config.SCRAPING_TIMEOUT_HTTP) as resposta:
+                charset = resposta.headers.get_content_charset() or 'utf-8'
+                html = resposta.read().decode(charset, errors='replace')
+                return html, {
+                    'etag': resposta.headers.get('ETag'),
+                    'last_modified': resposta.headers.get('Last-Modified')
+                }
+        except urllib.error.HTTPError as e:
+            if e.code == 304:
+                return None, {}
+            raise
+
+    def _html_navegador(self, fonte):
+        """
+        Carrega a página da fonte no Chrome e retorna (html, tempo_pronto)
+
+        Em vez de uma espera fixa, aguarda a tabela ter as linhas e colunas
+        esperadas (cabeçalho + 27 UFs), até SCRAPING_ESPERA_MAXIMA. Se o
+        limite estourar, lê o que já houver na página.
+        """
+        from selenium.common.exceptions import TimeoutException
+        from selenium.webdriver.support.ui import WebDriverWait
+
+        esperado = len(self.UFs) + 1
+
+        with self._driver_fonte(fonte) as driver:
+            inicio = time.monotonic()
+            driver.get(self.FONTES[fonte]['url'])
+            try:
+                WebDriverWait(driver, Config.SCRAPING_ESPERA_MAXIMA, poll_frequency=0.1).until(
+                    lambda d: d.execute_script(self.JS_TABELA_PRONTA, esperado)
+                )
+                tempo_pronto = round(time.monotonic() - inicio, 3)
+            except TimeoutException:
+                tempo_pronto = None
+
+            return driver.page_source, tempo_pronto
+
+    def _primeira_tabela(self, html):
+        """Retorna a primeira tabela do HTML (lista de linhas)"""
+        tabelas = extrair_tabelas(html)
+
+        if len(tabelas) == 0:
+            raise Exception("Nenhuma tabela encontrada")
+
+        return tabelas[0]
+
+    def _ler_tabela(self, tabela):
+        """Lê a tabela de alíquotas; falha se nenhuma UF de origem for reconhecida"""
+        matriz, aliquotas_internas, total_destinos = ler_matriz_aliquotas(tabela, self.UFs)
+
+        if len(matriz) == 0:
+            raise Exception("Nenhuma UF de origem encontrada na tabela")
+
+        return {
+            'linhas': len(tabela) - 1,
+            'matriz': matriz,
+            'aliquotas_internas': aliquotas_internas,
+            'total_destinos': total_destinos
+        }
+
+    def _resultado_tabela(self, fonte, tabela, validadores, **extras):
+        """Lê a tabela, ou a marca como inalterada se o hash bater com a última execução"""
+        anterior = self.validadores.get(fonte)
+        hash_tabela = hashlib.sha256(json.dumps(tabela, ensure_ascii=False).encode('utf-8')).hexdigest()
+
+        if anterior and anterior.get('hash_tabela') == hash_tabela:
+            # Mesmo conteúdo, mas guarda o ETag/Last-Modified novos: a próxima
+            # busca condicional pode receber 304 em vez da página inteira
+            return dict(extras, inalterada=True, motivo='tabela idêntica', validador=dict(anterior, **validadores))
+
+        resultado = self._ler_tabela(tabela)
+        resultado.update(extras, inalterada=False)
+        resultado['validador'] = dict(
+            validadores,
+            hash_tabela=hash_tabela,
+            resultado={'matriz': resultado['matriz'], 'aliquotas_internas': resultado['aliquotas_internas']}
+        )
+        return resultado
+
+    def _tabela_completa(self, fonte, resultado):
+        """True se o resultado (ou o da última execução, se inalterado) tem as 27x27 alíquotas"""
+        if resultado.get('inalterada'):
+            matriz = self.validadores[fonte]['resultado']['matriz']
+        else:
+            matriz = resultado['matriz']
+
+        total = len(self.UFs)
+        return MatrizAliquotas.de_dicionario(matriz).total_aliquotas == total * total
+
+    def _concluir_http(self, fonte, resultado=None):
+        """Marca a tentativa HTTP da fonte como concluída (resultado None em caso de falha)"""
+        with self._lock_http:
+            self._http_pendentes.discard(fonte)
+            if resultado is not None and self._tabela_completa(fonte, resultado):
+                self._tabela_completa_http = True
+            self._lock_http.notify_all()
+
+    def _navegador_necessario(self, fonte):
+        """
+        Aguarda as tentativas HTTP das demais fontes e indica se ainda vale
+        abrir o Chrome para esta fonte
+
+        Só com SCRAPING_PULAR_NAVEGADOR_SE_COMPLETA: se alguma fonte já trouxe
+        a tabela completa por HTTP, o navegador não é iniciado.
+        """
+        if not Config.SCRAPING_PULAR_NAVEGADOR_SE_COMPLETA:
+            return True
+
+        with self._lock_http:
+            self._lock_http.wait_for(
+                lambda: not (self._http_pendentes - {fonte}),
+                timeout=Config.SCRAPING_TIMEOUT_HTTP
+            )
+            return not self._tabela_completa_http
+
+    def _obter_fonte(self, fonte):
+        """
+        Obtém o HTML da fonte conforme a estratégia e lê a tabela
+
+        Pode rodar em uma thread própria: não altera o estado do scraper,
+        apenas retorna o resultado (ou levanta exceção).
+        """
+        config_fonte = self.FONTES[fonte]
+        estrategia = config_fonte['estrategia']
+        avisos = []
+
+        if self.modo_fixtures == 'reproduzir':
+            inicio = time.monotonic()
+            html = self._ler_fixture(fonte)
+            return self._resultado_tabela(
+                fonte, self._primeira_tabela(html), {},
+                estrategia='fixture', avisos=avisos, tempo_pronto_segundos=round(time.monotonic() - inicio, 3)
+            )
+
+        if estrategia == 'http':
+            resultado = None
+            try:
+                inicio = time.monotonic()
+                html, validadores = self._baixar_html(config_fonte['url'], self.validadores.get(fonte))
+                tempo_pronto = round(time.monotonic() - inicio, 3)
+
+                if html is None:
+                    # 304 só ocorre fora do modo de gravação (sem validadores)
+                    resultado = {
+                        'inalterada': True,
+                        'motivo': 'HTTP 304',
+                        'estrategia': estrategia,
+                        'avisos': avisos,
+                        'tempo_pronto_segundos': tempo_pronto
+                    }
+                    return resultado
+
+                tabela = self._primeira_tabela(html)
+                self._gravar_fixture(fonte, html)
+                resultado = self._resultado_tabela(
+                    fonte, tabela, validadores,
+                    estrategia=estrategia, avisos=avisos, tempo_pronto_segundos=tempo_pronto
+                )
+                return resultado
+            except Exception as e:
+                avisos.append(f"Tabela indisponível no HTML estático ({e}); usando navegador")
+                estrategia = 'navegador'
+            finally:
+                self._concluir_http(fonte, resultado)
+
+        if not self._navegador_necessario(fonte):
+            return {
+                'ignorada': True,
+                'motivo': 'tabela completa já obtida por HTTP de outra fonte',
+                'estrategia': estrategia,
+                'avisos': avisos,
+                'tempo_pronto_segundos': None
+            }
+
+        html, tempo_pronto = self._html_navegador(fonte)
+        self._gravar_fixture(fonte, html)
+        if tempo_pronto is None:
+            avisos.append(
+                f"Tabela incompleta após {Config.SCRAPING_ESPERA_MAXIMA}s; lendo o conteúdo disponível"
+            )
+
+        return self._resultado_tabela(
+            fonte, self._primeira_tabela(html), {},
+            estrategia=estrategia, avisos=avisos, tempo_pronto_segundos=tempo_pronto
+        )
+
+    def _registrar_fonte(self, fonte, resultado):
+        """Registra o resultado de uma fonte extraída com sucesso"""
+        for aviso in resultado['avisos']:
+            print(f"  ⚠ {aviso}")
+
+        if resultado.get('ignorada'):
+            print(f"  ↷ Navegador não iniciado: {resultado['motivo']}")
+            self.metadados_fontes[fonte] = {
+                'estrategia': None,
+                'tempo_pronto_segundos': None,
+                'inalterada': False,
+                'ignorada': True
+            }
             return None, None
 
+        print(f"  Estratégia utilizada: {resultado['estrategia']}")
+        if resultado['tempo_pronto_segundos'] is not None:
+            print(f"  Página pronta em {resultado['tempo_pronto_segundos']}s")
+
+        if resultado['inalterada']:
+            # Reaproveita o que foi lido na última execução, sem novo parse
+            validador = resultado.get('validador') or self.validadores[fonte]
+            print(f"  ✓ Sem alterações desde a última atualização ({resultado['motivo']})")
+            matriz = validador['resultado']['matriz']
+            aliquotas_internas = validador['resultado']['aliquotas_internas']
+        else:
+            validador = resultado['validador']
+            print(f"  Estados de destino encontrados: {resultado['total_destinos']}")
+            print(f"  Linhas de dados encontradas: {resultado['linhas']}")
+            for uf_origem, destinos in resultado['matriz'].items():
+                print(f"  ✓ {uf_origem}: {len(destinos)} alíquotas extraídas")
+            matriz = resultado['matriz']
+            aliquotas_internas = resultado['aliquotas_internas']
+
+        self.fonte_utilizada.append(fonte)
+        self.aliquotas_internas_fontes[fonte] = aliquotas_internas
+        self._novos_validadores[fonte] = validador
+        self.metadados_fontes[fonte] = {
+            'estrategia': resultado['estrategia'],
+            'tempo_pronto_segundos': resultado['tempo_pronto_segundos'],
+            'inalterada': resultado['inalterada'],
+            'ignorada': False
+        }
+
+        return matriz, aliquotas_internas
+
+    def _registrar_falha(self, fonte, erro):
+        erro_msg = f"Erro ao extrair de {self.FONTES[fonte]['nome']}: {erro}"
+        print(f"  ✗ {erro_msg}")
+        self.erros.append(erro_msg)
+        return None, None
+
+    def _extrair_fonte(self, fonte):
+        """Extrai uma única fonte na thread atual"""
+        print(f"\n📊 Tentando extrair de {self.FONTES[fonte]['nome']}...")
+
+        try:
+            return self._registrar_fonte(fonte, self._obter_fonte(fonte))
+        except Exception as e:
+            return self._registrar_falha(fonte, str(e))
+        finally:
+            self._fechar_driver(fonte)
+
+    def _extrair_fontes(self):
+        """
+        Extrai todas as fontes em paralelo, cada uma com o seu prazo
+
+        Uma fonte que estoura o prazo é abandonada: o navegador dela é
+        fechado e a execução segue com as demais. Retorna {fonte: matriz}.
+        """
+        executor = ThreadPoolExecutor(max_workers=len(self.FONTES), thread_name_prefix='scraper')
+        if self.modo_fixtures != 'reproduzir':
+            self._http_pendentes = {
+                fonte for fonte, config_fonte in self.FONTES.items() if config_fonte['estrategia'] == 'http'
+            }
+        inicio = time.monotonic()
+        futuros = {fonte: executor.submit(self._obter_fonte, fonte) for fonte in self.FONTES}
+        matrizes = {}
+
+        try:
+            # Registra na ordem de FONTES para manter a saída determinística
+            for fonte, futuro in futuros.items():
+                prazo = self.FONTES[fonte].get('timeout', Config.SCRAPING_TIMEOUT_FONTE)
+                restante = max(0, inicio + prazo - time.monotonic())
+
+                print(f"\n📊 Extraindo de {self.FONTES[fonte]['nome']}...")
+                try:
+                    matrizes[fonte], _ = self._registrar_fonte(fonte, futuro.result(timeout=restante))
+                except FuturesTimeoutError:
+                    futuro.cancel()
+                    with self._lock_drivers:
+                        self._fontes_abandonadas.add(fonte)
+                    self._registrar_falha(fonte, f"tempo esgotado após {prazo}s")
+                except Exception as e:
+                    self._registrar_falha(fonte, str(e))
+                finally:
+                    # Fechar o navegador também destrava uma fonte abandonada
+                    self._fechar_driver(fonte)
+        finally:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+        return matrizes
+
+    def scrape_conta_azul(self):
+        """Extrai dados da Conta Azul"""
+        return self._extrair_fonte('conta_azul')
+
+    def scrape_svrs(self):
+        """Extrai dados do portal SVRS"""
+        return self._extrair_fonte('svrs')
+
     def comparar_aliquotas_internas(self):
         """Compara alíquotas internas de diferentes fontes e escolhe a mais recente/correta"""
         print('\n🔍 Comparando alíquotas internas entre fontes...')
         
         if len(self.aliquotas_internas_fontes) < 2:
             print('  ⚠ Apenas uma fonte disponível, não há comparação')
+            for aliquotas in self.aliquotas_internas_fontes.values():
+                self.aliquotas_internas.update(aliquotas)
             return
         
         # Prioridade: SVRS > Conta Azul (SVRS é fonte oficial)
@@ -255,30 +540,41 @@ class ICMS_Scraper:
             print(f'  📊 Total de diferenças encontradas: {len(diferencas)}')
 
     def scrape(self):
-        """Tenta extrair dados de múltiplas fontes com redundância"""
+        """
+        Tenta extrair dados de múltiplas fontes com redundância
+
+        Retorna a matriz, ou None em caso de falha. Também retorna None, com
+        sem_alteracao=True, quando nenhuma fonte mudou desde a última
+        atualização confirmada.
+        """
         print('='*70)
         print('🚀 Iniciando scraping de alíquotas ICMS interestadual')
         print('='*70)
         
-        # Tenta Conta Azul primeiro
-        matriz_ca, aliq_int_ca = self.scrape_conta_azul()
-        
-        # Tenta SVRS como backup/complemento
-        matriz_svrs, aliq_int_svrs = self.scrape_svrs()
+        # Todas as fontes em paralelo: redundância sem somar as latências
+        matrizes = self._extrair_fontes()
+
+        # Nenhuma fonte mudou: não há o que comparar nem importar
+        if self.fonte_utilizada and all(self.metadados_fontes[f]['inalterada'] for f in self.fonte_utilizada):
+            self.sem_alteracao = True
+            print('\n✓ Nenhuma fonte mudou desde a última atualização; nada a importar')
+            return None
         
-        # Escolhe a melhor fonte
-        if matriz_ca and len(matriz_ca) > 0:
-            self.matriz_icms = matriz_ca
-            print('\n✓ Usando dados da Conta Azul como base principal')
-        elif matriz_svrs and len(matriz_svrs) > 0:
-            self.matriz_icms = matriz_svrs
-            print('\n✓ Usando dados do SVRS como base principal')
+        # Escolhe a melhor fonte, na ordem de preferência de FONTES
+        for fonte, config_fonte in self.FONTES.items():
+            if matrizes.get(fonte):
+                self.matriz_icms = matrizes[fonte]
+                print(f"\n✓ Usando dados de {config_fonte['nome']} como base principal")
+                break
         else:
             print('\n✗ Falha ao extrair dados de todas as fontes')
             return None
         
         # Compara e consolida alíquotas internas
         self.comparar_aliquotas_internas()
+
+        # Mesmos dados em arrays para consultas e cálculos
+        self.matriz_aliquotas = MatrizAliquotas.de_dicionario(self.matriz_icms, self.aliquotas_internas)
         
         # Validação final
         self.validar_extracao()
@@ -308,6 +604,11 @@ class ICMS_Scraper:
             else:
                 print(f"  ✓ {estado}: completo ({destinos}/27)")
 
+        for (origem, destino), texto in self.matriz_aliquotas.invalidas.items():
+            msg = f"Alíquota não numérica {origem} → {destino or 'interna'}: '{texto}'"
+            print(f"  ⚠ {msg}")
+            self.erros.append(msg)
+
     def salvar_json(self, nome_arquivo='icms_interestadual.json'):
         """Salva os dados em JSON"""
         if not self.matriz_icms:
@@ -321,6 +622,7 @@ class ICMS_Scraper:
             'metadata': {
                 'fontes_consultadas': list(self.FONTES.keys()),
                 'fontes_utilizadas': self.fonte_utilizada,
+                'fontes': self.metadados_fontes,
                 'data_extracao': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
                 'total_estados': len(self.matriz_icms),
                 'total_aliquotas': sum(len(destinos) for destinos in self.matriz_icms.values()),
@@ -343,6 +645,7 @@ class ICMS_Scraper:
             'metadata': {
                 'fontes_consultadas': list(self.FONTES.keys()),
                 'fontes_utilizadas': self.fonte_utilizada,
+                'fontes': self.metadados_fontes,
                 'data_extracao': datetime.now().isoformat(),
                 'total_estados': len(self.matriz_icms),
                 'total_aliquotas': sum(len(destinos) for destinos in self.matriz_icms.values()),
@@ -363,12 +666,12 @@ class ICMS_Scraper:
             print(f"✗ Estado de origem '{uf_origem}' não encontrado")
             return None
         
-        if uf_destino not in self.matriz_icms[uf_origem]:
+        aliquota = self.matriz_aliquotas.aliquota(uf_origem, uf_destino)
+        
+        if aliquota is None:
             print(f"✗ Estado de destino '{uf_destino}' não encontrado para origem {uf_origem}")
             return None
         
-        aliquota = self.matriz_icms[uf_origem][uf_destino]
-        
         return {
             'origem': uf_origem,
             'destino': uf_destino,
@@ -384,21 +687,16 @@ class ICMS_Scraper:
             return None
         
         aliquota = resultado['aliquota']
+        valor_icms = valor_operacao * (aliquota / 100)
         
-        if isinstance(aliquota, (int, float)):
-            valor_icms = valor_operacao * (aliquota / 100)
-            
-            return {
-                'origem': uf_origem,
-                'destino': uf_destino,
-                'valor_operacao': valor_operacao,
-                'aliquota_percentual': aliquota,
-                'valor_icms': round(valor_icms, 2),
-                'tipo': resultado['tipo']
-            }
-        else:
-            print(f"✗ Não foi possível calcular. Alíquota não numérica: {aliquota}")
-            return None
+        return {
+            'origem': uf_origem,
+            'destino': uf_destino,
+            'valor_operacao': valor_operacao,
+            'aliquota_percentual': aliquota,
+            'valor_icms': round(valor_icms, 2),
+            'tipo': resultado['tipo']
+        }
     
     def calcular_difal(self, uf_origem, uf_destino, valor_operacao):
         """Calcula o Diferencial de Alíquota (DIFAL)"""
@@ -407,10 +705,10 @@ class ICMS_Scraper:
             return None
         
         # Alíquota interestadual (origem -> destino)
-        aliquota_interestadual = self.matriz_icms.get(uf_origem, {}).get(uf_destino)
+        aliquota_interestadual = self.matriz_aliquotas.aliquota(uf_origem, uf_destino)
         
         # Alíquota interna do estado de destino
-        aliquota_interna_destino = self.aliquotas_internas.get(uf_destino)
+        aliquota_interna_destino = self.matriz_aliquotas.aliquota_interna(uf_destino)
         
         if not aliquota_interestadual or not aliquota_interna_destino:
             print("✗ Não foi possível calcular DIFAL. Dados incompletos.")
@@ -450,11 +748,7 @@ class ICMS_Scraper:
             print(f"  {uf}: {self.aliquotas_internas[uf]}%")
         
         # Estatísticas de alíquotas interestaduais
-        todas_aliquotas_inter = []
-        for origem in self.matriz_icms:
-            for destino, aliquota in self.matriz_icms[origem].items():
-                if origem != destino and isinstance(aliquota, (int, float)):
-                    todas_aliquotas_inter.append(aliquota)
+        todas_aliquotas_inter = self.matriz_aliquotas.valores_interestaduais().tolist()
         
         if todas_aliquotas_inter:
             print("\n📈 ESTATÍSTICAS GERAIS (Operações Interestaduais):")
@@ -481,9 +775,16 @@ class ICMS_Scraper:
         print("\n" + "="*70)
     
     def fechar(self):
-        """Fecha o navegador"""
-        try:
-            self.driver.quit()
+        """
+        Fecha navegadores ainda presos a fontes abandonadas
+
+        Os demais já voltaram ao pool e continuam aquecidos para a próxima
+        atualização; o pool é encerrado na saída do processo.
+        """
+        with self._lock_drivers:
+            fontes = list(self._drivers)
+
+        for fonte in fontes:
+            self._fechar_driver(fonte)
+        if fontes:
             print("🔒 Navegador fechado")
-        except:
-            pass
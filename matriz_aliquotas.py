@@ -0,0 +1,161 @@
+"""
+Matriz de alíquotas em arrays contíguos
+
+Substitui o dicionário aninhado {origem: {destino: aliquota}} como
+representação em memória: um array 27x27 de float64 na ordem de ufs.UFS
+(NaN onde não há alíquota) e um vetor separado de alíquotas internas.
+A conversão para os formatos JSON da API é feita sob demanda.
+"""
+import numpy as np
+from ufs import UFS, INDICE_UF
+
+
+class MatrizAliquotas:
+    """Alíquotas interestaduais (27x27) e internas (27) indexadas por UF"""
+
+    __slots__ = ('valores', 'internas', 'invalidas')
+
+    def __init__(self, valores=None, internas=None):
+        total = len(UFS)
+        self.valores = np.full((total, total), np.nan) if valores is None else np.asarray(valores, dtype=np.float64)
+        self.internas = np.full(total, np.nan) if internas is None else np.asarray(internas, dtype=np.float64)
+
+        # Células recebidas que não puderam ser lidas: {(origem, destino): valor original}
+        self.invalidas = {}
+
+    @classmethod
+    def de_dicionario(cls, matriz, aliquotas_internas=None):
+        """
+        Monta a partir de {origem: {destino: aliquota}} e {uf: aliquota}
+
+        Valores não numéricos ou UFs desconhecidas não entram nos arrays;
+        ficam em `invalidas` (internas com destino None) para serem
+        reportados por quem monta a matriz.
+        """
+        resultado = cls()
+
+        for origem, destinos in (matriz or {}).items():
+            i = INDICE_UF.get(origem)
+            for destino, aliquota in destinos.items():
+                j = INDICE_UF.get(destino)
+                valor = _numero(aliquota)
+                if i is None or j is None or valor is None:
+                    resultado.invalidas[(origem, destino)] = aliquota
+                else:
+                    resultado.valores[i, j] = valor
+
+        for uf, aliquota in (aliquotas_internas or {}).items():
+            i = INDICE_UF.get(uf)
+            valor = _numero(aliquota)
+            if i is None or valor is None:
+                resultado.invalidas[(uf, None)] = aliquota
+            else:
+                resultado.internas[i] = valor
+
+        return resultado
+
+    # ----------------------------------------
+    # Acesso
+    # ----------------------------------------
+
+    def definir(self, origem, destino, aliquota):
+        """Grava uma alíquota interestadual; retorna False se alguma UF for desconhecida"""
+        i = INDICE_UF.get(origem)
+        j = INDICE_UF.get(destino)
+        if i is None or j is None:
+            return False
+
+        self.valores[i, j] = aliquota
+        return True
+
+    def definir_interna(self, uf, aliquota):
+        """Grava a alíquota interna de uma UF; retorna False se a UF for desconhecida"""
+        i = INDICE_UF.get(uf)
+        if i is None:
+            return False
+
+        self.internas[i] = aliquota
+        return True
+
+    def aliquota(self, origem, destino):
+        """Alíquota origem → destino ou None"""
+        i = INDICE_UF.get(origem)
+        j = INDICE_UF.get(destino)
+        if i is None or j is None:
+            return None
+
+        valor = self.valores[i, j]
+        return None if np.isnan(valor) else float(valor)
+
+    def aliquota_interna(self, uf):
+        """Alíquota interna da UF ou None"""
+        i = INDICE_UF.get(uf)
+        if i is None:
+            return None
+
+        valor = self.internas[i]
+        return None if np.isnan(valor) else float(valor)
+
+    @property
+    def mascara(self):
+        """Array booleano 27x27: True onde há alíquota"""
+        return ~np.isnan(self.valores)
+
+    def origens(self):
+        """UFs de origem com ao menos uma alíquota, na ordem de UFS"""
+        return [UFS[i] for i in np.flatnonzero(self.mascara.any(axis=1))]
+
+    @property
+    def total_estados(self):
+        return int(self.mascara.any(axis=1).sum())
+
+    @property
+    def total_aliquotas(self):
+        return int(self.mascara.sum())
+
+    @property
+    def total_internas(self):
+        return int((~np.isnan(self.internas)).sum())
+
+    def valores_interestaduais(self):
+        """Alíquotas com origem diferente do destino (sem a diagonal)"""
+        fora_diagonal = self.mascara & ~np.eye(len(UFS), dtype=bool)
+        return self.valores[fora_diagonal]
+
+    # ----------------------------------------
+    # Conversão para os formatos JSON
+    # ----------------------------------------
+
+    def para_dicionario(self):
+        """{origem: {destino: aliquota}} apenas com as células preenchidas"""
+        mascara = self.mascara
+        matriz = {}
+
+        for i in np.flatnonzero(mascara.any(axis=1)):
+            linha = self.valores[i]
+            matriz[UFS[i]] = {UFS[j]: float(linha[j]) for j in np.flatnonzero(mascara[i])}
+
+        return matriz
+
+    def para_lista(self):
+        """[{origem, destino, aliquota}] na ordem de UFS"""
+        origens, destinos = np.nonzero(self.mascara)
+        return [
+            {"origem": UFS[i], "destino": UFS[j], "aliquota": float(self.valores[i, j])}
+            for i, j in zip(origens.tolist(), destinos.tolist())
+        ]
+
+    def internas_para_dicionario(self):
+        """{uf: aliquota} das alíquotas internas preenchidas"""
+        return {UFS[i]: float(self.internas[i]) for i in np.flatnonzero(~np.isnan(self.internas))}
+
+
+def _numero(valor):
+    """Converte '12', '12,5%' ou 12 em float; None se não for numérico"""
+    if isinstance(valor, str):
+        valor = valor.replace('%', '').replace(',', '.').strip()
+    try:
+        numero = float(valor)
+    except (ValueError, TypeError):
+        return None
+    return None if np.isnan(numero) else numero
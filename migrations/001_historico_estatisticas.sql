@@ -0,0 +1,8 @@
+-- Estatísticas da importação em historico_atualizacoes (usadas por /api/info)
+-- Para bancos criados com um schema.sql anterior; pode ser executada mais de uma vez.
+ALTER TABLE historico_atualizacoes ADD COLUMN IF NOT EXISTS total_estados INT;
+ALTER TABLE historico_atualizacoes ADD COLUMN IF NOT EXISTS total_aliquotas_internas INT;
+ALTER TABLE historico_atualizacoes ADD COLUMN IF NOT EXISTS total_aliquotas_interestaduais INT;
+ALTER TABLE historico_atualizacoes ADD COLUMN IF NOT EXISTS duracao_segundos DECIMAL(10,3);
+
+CREATE INDEX IF NOT EXISTS idx_historico_created_at ON historico_atualizacoes(created_at DESC);
@@ -0,0 +1,22 @@
+-- Função usada por SupabaseDB.inserir_aliquotas_internas (substituição atômica)
+-- Para bancos criados com um schema.sql anterior; pode ser executada mais de uma vez.
+CREATE OR REPLACE FUNCTION substituir_aliquotas_internas(p_registros JSONB, p_fonte VARCHAR)
+RETURNS INT
+LANGUAGE plpgsql
+AS $$
+DECLARE
+    total INT;
+BEGIN
+    UPDATE aliquotas_internas
+    SET ativo = FALSE, updated_at = NOW()
+    WHERE ativo = TRUE
+      AND uf IN (SELECT r->>'uf' FROM jsonb_array_elements(p_registros) AS r);
+
+    INSERT INTO aliquotas_internas (uf, aliquota, fonte, ativo)
+    SELECT r->>'uf', (r->>'aliquota')::DECIMAL(5,2), p_fonte, TRUE
+    FROM jsonb_array_elements(p_registros) AS r;
+
+    GET DIAGNOSTICS total = ROW_COUNT;
+    RETURN total;
+END;
+$$;
@@ -0,0 +1,278 @@
+"""
+Pool de navegadores Chrome reaproveitados entre atualizações
+
+Manter o Chrome aberto evita pagar a inicialização do navegador a cada
+scraping. Cada navegador passa por um health check ao ser emprestado e é
+reciclado após NAVEGADOR_MAX_USOS usos, quando o heap JavaScript passa de
+NAVEGADOR_MAX_MEMORIA_MB ou quando o uso termina com erro. Navegadores
+livres há mais de NAVEGADOR_OCIOSO_SEGUNDOS são fechados, para que cada
+worker não mantenha um Chrome aberto entre atualizações espaçadas.
+"""
+import atexit
+import threading
+import time
+from contextlib import contextmanager
+from config import Config
+
+
+# Recursos que a leitura da tabela não usa: imagens, fontes, CSS, mídia e
+# scripts de terceiros (analytics, anúncios, embeds). Os scripts da própria
+# página continuam liberados, pois podem montar a tabela. O '*' final cobre
+# URLs com query string (ex.: style.css?ver=6.4).
+RECURSOS_BLOQUEADOS = (
+    '*.png*', '*.jpg*', '*.jpeg*', '*.gif*', '*.webp*', '*.avif*', '*.svg*', '*.ico*',
+    '*.woff*', '*.ttf*', '*.otf*', '*.eot*',
+    '*.css*', '*.mp4*', '*.webm*', '*.mp3*',
+    '*google-analytics.com*', '*googletagmanager.com*', '*googleadservices.com*',
+    '*doubleclick.net*', '*googlesyndication.com*', '*facebook.net*', '*facebook.com/tr*',
+    '*hotjar.com*', '*clarity.ms*', '*hubspot.com*', '*hs-scripts.com*', '*hs-analytics.net*',
+    '*linkedin.com/px*', '*licdn.com*', '*tiktok.com*', '*youtube.com*', '*ytimg.com*',
+    '*vimeo.com*', '*intercom.io*', '*zendesk.com*', '*rdstation.com.br*'
+)
+
+# Preferências de conteúdo do Chrome (2 = bloquear)
+PREFERENCIAS_BLOQUEIO = {
+    'profile.managed_default_content_settings.images': 2,
+    'profile.managed_default_content_settings.media_stream': 2,
+    'profile.managed_default_content_settings.plugins': 2,
+    'profile.managed_default_content_settings.popups': 2,
+    'profile.managed_default_content_settings.geolocation': 2,
+    'profile.managed_default_content_settings.notifications': 2
+}
+
+
+def _bloquear_recursos(driver):
+    """Bloqueia as requisições desnecessárias via Chrome DevTools Protocol"""
+    try:
+        driver.execute_cdp_cmd('Network.enable', {})
+        driver.execute_cdp_cmd('Network.setBlockedURLs', {
+            'urls': list(RECURSOS_BLOQUEADOS) + Config.SCRAPING_URLS_BLOQUEADAS
+        })
+    except Exception as e:
+        # Sem CDP (ex.: driver remoto) seguem valendo as preferências de conteúdo
+        print(f"⚠️  Bloqueio de recursos via CDP indisponível: {e}")
+
+
+def criar_driver_chrome(headless=True):
+    """Inicia um Chrome com as opções usadas no scraping"""
+    from selenium import webdriver
+    from selenium.webdriver.chrome.options import Options
+
+    chrome_options = Options()
+
+    if Config.SCRAPING_BLOQUEAR_RECURSOS:
+        chrome_options.add_argument("--blink-settings=imagesEnabled=false")
+        chrome_options.add_experimental_option('prefs', PREFERENCIAS_BLOQUEIO)
+
+    if headless:
+        chrome_options.add_argument("--headless")
+    chrome_options.add_argument("--no-sandbox")
+    chrome_options.add_argument("--disable-dev-shm-usage")
+    chrome_options.add_argument("--disable-gpu")
+    chrome_options.add_argument("--window-size=1920,1080")
+    chrome_options.add_argument("--disable-blink-features=AutomationControlled")
+    chrome_options.add_experimental_option("excludeSwitches", ["enable-automation"])
+    chrome_options.add_experimental_option('useAutomationExtension', False)
+
+    print("🌐 Iniciando navegador...")
+    driver = webdriver.Chrome(options=chrome_options)
+
+    if Config.SCRAPING_BLOQUEAR_RECURSOS:
+        _bloquear_recursos(driver)
+
+    return driver
+
+
+class PoolNavegadores:
+    """Empresta navegadores aquecidos; no máximo `tamanho` abertos ao mesmo tempo"""
+
+    def __init__(self, criar, tamanho=None, max_usos=None, max_memoria_mb=None, espera=None, ocioso=None):
+        self._criar = criar
+        self.tamanho = max(1, Config.NAVEGADOR_POOL_TAMANHO if tamanho is None else tamanho)
+        self.max_usos = Config.NAVEGADOR_MAX_USOS if max_usos is None else max_usos
+        self.max_memoria_mb = Config.NAVEGADOR_MAX_MEMORIA_MB if max_memoria_mb is None else max_memoria_mb
+        self.espera = Config.NAVEGADOR_ESPERA_POOL if espera is None else espera
+        self.ocioso = Config.NAVEGADOR_OCIOSO_SEGUNDOS if ocioso is None else ocioso
+
+        self._livres = []
+        self._total = 0
+        self._encerrado = False
+        self._cond = threading.Condition()
+        self._timer_ocioso = None
+
+    @contextmanager
+    def emprestar(self):
+        """Empresta um navegador; se o uso falhar, ele é descartado na devolução"""
+        navegador = self._obter()
+        sucesso = False
+        try:
+            yield navegador['driver']
+            sucesso = True
+        finally:
+            self._devolver(navegador, sucesso)
+
+    def encerrar(self):
+        """Fecha os navegadores livres; os emprestados são fechados na devolução"""
+        with self._cond:
+            self._encerrado = True
+            livres, self._livres = self._livres, []
+            self._cancelar_timer_ocioso()
+            self._cond.notify_all()
+
+        for navegador in livres:
+            self._descartar(navegador)
+
+    def _obter(self):
+        prazo = time.monotonic() + self.espera
+
+        while True:
+            navegador = None
+
+            with self._cond:
+                while not self._livres and self._total >= self.tamanho:
+                    restante = prazo - time.monotonic()
+                    if self._encerrado or restante <= 0:
+                        raise Exception("Nenhum navegador disponível no pool")
+                    self._cond.wait(restante)
+
+                if self._encerrado:
+                    raise Exception("Pool de navegadores encerrado")
+
+                if self._livres:
+                    navegador = self._livres.pop()
+                else:
+                    self._total += 1
+
+            if navegador is None:
+                try:
+                    return {'driver': self._criar(), 'usos': 0}
+                except Exception:
+                    with self._cond:
+                        self._total -= 1
+                        self._cond.notify()
+                    raise
+
+            if self._saudavel(navegador['driver']):
+                return navegador
+
+            print("♻️  Navegador do pool não responde; substituindo")
+            self._descartar(navegador)
+
+    def _devolver(self, navegador, sucesso):
+        navegador['usos'] += 1
+        driver = navegador['driver']
+        motivo = None
+
+        if not sucesso:
+            motivo = 'falha durante o uso'
+        elif navegador['usos'] >= self.max_usos:
+            motivo = f"{navegador['usos']} usos"
+        else:
+            memoria = self._memoria_mb(driver)
+            if self.max_memoria_mb and memoria and memoria > self.max_memoria_mb:
+                motivo = f"heap de {memoria:.0f} MB"
+
+        if motivo is None:
+            try:
+                # Libera a página carregada antes de voltar ao pool
+                driver.get('about:blank')
+            except Exception:
+                motivo = 'falha ao limpar a página'
+
+        if motivo is not None:
+            print(f"♻️  Reciclando navegador ({motivo})")
+            self._descartar(navegador)
+            return
+
+        with self._cond:
+            if not self._encerrado:
+                navegador['livre_desde'] = time.monotonic()
+                self._livres.append(navegador)
+                if self._timer_ocioso is None:
+                    self._agendar_fechamento_ociosos(self.ocioso)
+                self._cond.notify()
+                return
+
+        self._descartar(navegador)
+
+    def _agendar_fechamento_ociosos(self, atraso):
+        """Agenda a verificação de navegadores ociosos (chamar com self._cond adquirido)"""
+        if self.ocioso <= 0 or not self._livres:
+            return
+
+        self._cancelar_timer_ocioso()
+        self._timer_ocioso = threading.Timer(atraso, self._fechar_ociosos)
+        self._timer_ocioso.daemon = True
+        self._timer_ocioso.start()
+
+    def _cancelar_timer_ocioso(self):
+        if self._timer_ocioso is not None:
+            self._timer_ocioso.cancel()
+            self._timer_ocioso = None
+
+    def _fechar_ociosos(self):
+        """Fecha os navegadores livres há mais de `ocioso` segundos"""
+        limite = time.monotonic() - self.ocioso
+
+        with self._cond:
+            self._timer_ocioso = None
+            ociosos = [n for n in self._livres if n['livre_desde'] <= limite]
+            self._livres = [n for n in self._livres if n['livre_desde'] > limite]
+
+            # Reagenda para o próximo navegador que ficará ocioso
+            if self._livres:
+                mais_antigo = min(n['livre_desde'] for n in self._livres)
+                self._agendar_fechamento_ociosos(max(0, mais_antigo - limite))
+
+        if ociosos:
+            print(f"💤 Fechando {len(ociosos)} navegador(es) ocioso(s) há mais de {self.ocioso}s")
+        for navegador in ociosos:
+            self._descartar(navegador)
+
+    def _descartar(self, navegador):
+        try:
+            navegador['driver'].quit()
+        except Exception:
+            pass
+
+        with self._cond:
+            self._total -= 1
+            self._cond.notify()
+
+    def _saudavel(self, driver):
+        try:
+            return driver.execute_script('return 1') == 1 and len(driver.window_handles) > 0
+        except Exception:
+            return False
+
+    def _memoria_mb(self, driver):
+        try:
+            usado = driver.execute_script(
+                'return performance.memory ? performance.memory.usedJSHeapSize : null'
+            )
+            return usado / (1024 * 1024) if usado else None
+        except Exception:
+            return None
+
+
+_pools = {}
+_lock_pools = threading.Lock()
+
+
+def obter_pool(headless=True, tamanho=None):
+    """Pool do processo atual para o modo de navegador pedido (tamanho vale na criação)"""
+    with _lock_pools:
+        if headless not in _pools:
+            _pools[headless] = PoolNavegadores(lambda: criar_driver_chrome(headless), tamanho)
+        return _pools[headless]
+
+
+@atexit.register
+def encerrar_pools():
+    """Fecha todos os navegadores abertos pelo processo"""
+    with _lock_pools:
+        pools = list(_pools.values())
+        _pools.clear()
+
+    for pool in pools:
+        pool.encerrar()
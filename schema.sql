@@ -34,6 +34,10 @@ CREATE TABLE historico_atualizacoes (
     fonte VARCHAR(50) NOT NULL,
     status VARCHAR(20) NOT NULL, -- 'sucesso', 'erro', 'parcial'
     total_registros_inseridos INT DEFAULT 0,
+    total_estados INT,
+    total_aliquotas_internas INT,
+    total_aliquotas_interestaduais INT,
+    duracao_segundos DECIMAL(10,3),
     mensagem TEXT,
     data_extracao TIMESTAMP NOT NULL,
     created_at TIMESTAMP DEFAULT NOW()
@@ -44,6 +48,30 @@ CREATE INDEX idx_aliq_inter_destino ON aliquotas_interestaduais(uf_destino);
 CREATE INDEX idx_aliq_inter_ativo ON aliquotas_interestaduais(ativo);
 CREATE INDEX idx_aliq_interna_uf ON aliquotas_internas(uf);
 CREATE INDEX idx_aliq_interna_ativo ON aliquotas_internas(ativo);
+CREATE INDEX idx_historico_created_at ON historico_atualizacoes(created_at DESC);
+
+-- Substitui as alíquotas internas ativas em uma única transação:
+-- leitores veem o conjunto anterior ou o novo, nunca um estado sem alíquota ativa.
+CREATE OR REPLACE FUNCTION substituir_aliquotas_internas(p_registros JSONB, p_fonte VARCHAR)
+RETURNS INT
+LANGUAGE plpgsql
+AS $$
+DECLARE
+    total INT;
+BEGIN
+    UPDATE aliquotas_internas
+    SET ativo = FALSE, updated_at = NOW()
+    WHERE ativo = TRUE
+      AND uf IN (SELECT r->>'uf' FROM jsonb_array_elements(p_registros) AS r);
+
+    INSERT INTO aliquotas_internas (uf, aliquota, fonte, ativo)
+    SELECT r->>'uf', (r->>'aliquota')::DECIMAL(5,2), p_fonte, TRUE
+    FROM jsonb_array_elements(p_registros) AS r;
+
+    GET DIAGNOSTICS total = ROW_COUNT;
+    RETURN total;
+END;
+$$;
 
 ALTER TABLE estados ENABLE ROW LEVEL SECURITY;
 ALTER TABLE aliquotas_internas ENABLE ROW LEVEL SECURITY;
@@ -0,0 +1,19 @@
+"""
+Servidor WSGI alternativo com waitress (ex.: Windows, onde o gunicorn não roda)
+
+Uso: python serve.py
+"""
+from waitress import serve
+from config import Config
+from api import app, iniciar_agendador, snapshot
+
+if __name__ == '__main__':
+    snapshot.carregar()
+    iniciar_agendador()
+    print(f"🚀 Iniciando API (waitress) em {Config.WSGI_HOST}:{Config.FLASK_PORT} com {Config.WSGI_THREADS} threads")
+    serve(
+        app,
+        host=Config.WSGI_HOST,
+        port=Config.FLASK_PORT,
+        threads=Config.WSGI_THREADS
+    )
@@ -0,0 +1,348 @@
+import gzip
+import hashlib
+import json
+import os
+import threading
+import time
+from datetime import datetime, timezone
+import numpy as np
+from config import Config
+from matriz_aliquotas import MatrizAliquotas
+from ufs import UFS, INDICE_UF
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+
+def _data_utc(valor):
+    """Converte o timestamp ISO do PostgREST em datetime UTC; None se ausente ou inválido"""
+    if not valor:
+        return None
+
+    try:
+        data = datetime.fromisoformat(str(valor).replace('Z', '+00:00'))
+    except ValueError:
+        return None
+
+    # Colunas TIMESTAMP sem fuso são gravadas em UTC (NOW() do Supabase)
+    if data.tzinfo is None:
+        return data.replace(tzinfo=timezone.utc)
+    return data.astimezone(timezone.utc)
+
+
+class DadosAliquotas:
+    """Versão imutável das alíquotas carregadas do banco"""
+
+    def __init__(self, interestaduais=None, internas=None, ultima_atualizacao=None, estados=None):
+        self.matriz = MatrizAliquotas()
+
+        # Fonte de cada célula, paralela a matriz.valores (importações parciais
+        # mantêm células de fontes diferentes)
+        self.fontes = np.full(self.matriz.valores.shape, None, dtype=object)
+
+        # Registros vêm ordenados por created_at: o mais recente prevalece
+        for registro in interestaduais or []:
+            origem = registro['uf_origem']
+            destino = registro['uf_destino']
+
+            if self.matriz.definir(origem, destino, float(registro['aliquota'])):
+                self.fontes[INDICE_UF[origem], INDICE_UF[destino]] = registro.get('fonte')
+
+        self.internas = [
+            {
+                'uf': item['uf'],
+                'aliquota': float(item['aliquota']),
+                'fonte': item.get('fonte')
+            }
+            for item in internas or []
+        ]
+        for item in self.internas:
+            self.matriz.definir_interna(item['uf'], item['aliquota'])
+
+        # Registro de estados indexado por UF, já com a alíquota interna
+        self.estados = {}
+        for estado in estados or []:
+            self.estados[estado['uf']] = {
+                'uf': estado['uf'],
+                'nome': estado['nome'],
+                'regiao': estado['regiao'],
+                'aliquota_interna': self.matriz.aliquota(estado['uf'], estado['uf'])
+            }
+        self.lista_estados = [
+            {'uf': e['uf'], 'nome': e['nome'], 'regiao': e['regiao']}
+            for e in self.estados.values()
+        ]
+
+        # UFs aceitas nas rotas; sem a tabela de estados, usa as 27 UFs canônicas
+        self.ufs = frozenset(self.estados) or frozenset(UFS)
+
+        self.carregado_em = datetime.now()
+        self.carregado_monotonic = time.monotonic()
+
+        # Hash do conteúdo: identifica a versão dos dados (ETag)
+        conteudo = json.dumps(
+            [self.fontes.tolist(), self.internas, self.lista_estados],
+            sort_keys=True,
+            separators=(',', ':')
+        )
+        hash_conteudo = hashlib.sha256(self.matriz.valores.tobytes())
+        hash_conteudo.update(conteudo.encode('utf-8'))
+        self.versao = hash_conteudo.hexdigest()
+        self.atualizado_em = self.carregado_em
+
+        # Last-Modified: o mais recente entre a importação registrada e o momento
+        # em que este conteúdo foi visto. O histórico é gravado depois dos dados:
+        # uma carga no meio da importação traz o conteúdo novo com o horário da
+        # importação anterior
+        self.visto_em = datetime.now(timezone.utc).replace(microsecond=0)
+        self.importado_em = _data_utc((ultima_atualizacao or {}).get('created_at'))
+        self.ultima_modificacao = self._ultima_modificacao(self.importado_em)
+
+        self._corpos = {}
+        self._lock_corpos = threading.RLock()
+
+        self.estatisticas = self._montar_estatisticas(ultima_atualizacao)
+
+    def _montar_estatisticas(self, ultima_atualizacao):
+        """Estatísticas da última importação (historico_atualizacoes), com contagens em memória como reserva"""
+        ultima_atualizacao = ultima_atualizacao or {}
+
+        def valor(campo, padrao):
+            return ultima_atualizacao.get(campo) if ultima_atualizacao.get(campo) is not None else padrao
+
+        duracao = ultima_atualizacao.get('duracao_segundos')
+
+        return {
+            'total_estados': valor('total_estados', self.matriz.total_estados),
+            'total_aliquotas_internas': valor('total_aliquotas_internas', len(self.internas)),
+            'total_aliquotas_interestaduais': valor('total_aliquotas_interestaduais', self.matriz.total_aliquotas),
+            'ultima_atualizacao': ultima_atualizacao.get('created_at'),
+            'data_extracao': ultima_atualizacao.get('data_extracao'),
+            'duracao_segundos': float(duracao) if duracao is not None else None,
+            'fonte': ultima_atualizacao.get('fonte')
+        }
+
+    def _ultima_modificacao(self, importado_em):
+        if importado_em is None:
+            return self.visto_em
+        return max(importado_em.replace(microsecond=0), self.visto_em)
+
+    def consultar_aliquota(self, uf_origem, uf_destino):
+        """Alíquota entre dois estados ({uf_origem, uf_destino, aliquota, fonte}) ou None"""
+        aliquota = self.matriz.aliquota(uf_origem, uf_destino)
+        if aliquota is None:
+            return None
+
+        return {
+            'uf_origem': uf_origem,
+            'uf_destino': uf_destino,
+            'aliquota': aliquota,
+            'fonte': self.fontes[INDICE_UF[uf_origem], INDICE_UF[uf_destino]]
+        }
+
+    def _montar_matriz(self, formato):
+        """Monta o corpo JSON da matriz no formato aninhado ou em lista"""
+        if formato == 'list':
+            lista = self.matriz.para_lista()
+            return {
+                "data": lista,
+                "total": len(lista),
+                "timestamp": self.atualizado_em.isoformat()
+            }
+
+        return {
+            "data": self.matriz.para_dicionario(),
+            "total_estados": self.matriz.total_estados,
+            "total_combinacoes": self.matriz.total_aliquotas,
+            "timestamp": self.atualizado_em.isoformat()
+        }
+
+    def corpo_matriz(self, formato, codificacao=None):
+        """
+        Retorna o corpo serializado (e opcionalmente comprimido) da matriz
+
+        Cada combinação de formato e codificação é serializada uma única vez
+        por versão dos dados.
+        """
+        chave = (formato, codificacao)
+        corpo = self._corpos.get(chave)
+        if corpo is not None:
+            return corpo
+
+        with self._lock_corpos:
+            if chave not in self._corpos:
+                if codificacao is None:
+                    self._corpos[chave] = json.dumps(
+                        self._montar_matriz(formato),
+                        sort_keys=True,
+                        separators=(',', ':')
+                    ).encode('utf-8')
+                elif codificacao == 'gzip':
+                    self._corpos[chave] = gzip.compress(self.corpo_matriz(formato), compresslevel=9)
+                elif codificacao == 'br':
+                    self._corpos[chave] = brotli.compress(self.corpo_matriz(formato))
+                else:
+                    raise ValueError(f"Codificação não suportada: {codificacao}")
+            return self._corpos[chave]
+
+
+class SnapshotAliquotas:
+    """
+    Snapshot em memória das alíquotas
+
+    As consultas leem apenas da versão atual, que é substituída de forma
+    atômica (troca de referência) após uma importação ou quando o intervalo
+    configurado expira. Cada carga bem-sucedida do banco é gravada em um
+    arquivo local, usado para aquecer o processo antes de o banco responder.
+    """
+
+    # Intervalo mínimo entre tentativas de carga após uma falha
+    INTERVALO_NOVA_TENTATIVA = 5
+
+    def __init__(self, obter_db, intervalo=None, arquivo=None):
+        self.obter_db = obter_db
+        self.intervalo = Config.SNAPSHOT_INTERVALO if intervalo is None else intervalo
+        self.arquivo = Config.SNAPSHOT_ARQUIVO if arquivo is None else arquivo
+        self._dados = DadosAliquotas()
+        self._carregado = False
+        self._do_arquivo = False
+        self._ultima_tentativa = float('-inf')
+        self._lock = threading.Lock()
+        self._atualizando = False
+
+    def _trocar(self, novo):
+        """Substitui a versão atual; retorna False se os dados não mudaram"""
+        if self._carregado and novo.versao == self._dados.versao:
+            # Dados inalterados: mantém a versão atual (e seus corpos serializados)
+            self._dados.carregado_monotonic = novo.carregado_monotonic
+            self._dados.estatisticas = novo.estatisticas
+            # Mantém o momento em que o conteúdo foi visto; o registro da
+            # importação pode ter chegado depois
+            self._dados.importado_em = novo.importado_em
+            self._dados.ultima_modificacao = self._dados._ultima_modificacao(novo.importado_em)
+            return False
+
+        self._dados = novo
+        self._carregado = True
+        return True
+
+    def carregar(self):
+        """Recarrega os dados do banco e troca a versão atual"""
+        self._ultima_tentativa = time.monotonic()
+
+        try:
+            db = self.obter_db()
+            dados = db.obter_dados_snapshot()
+            novo = DadosAliquotas(
+                dados['interestaduais'],
+                dados['internas'],
+                dados.get('ultima_atualizacao'),
+                dados.get('estados')
+            )
+        except Exception as e:
+            print(f"❌ Erro ao carregar snapshot de alíquotas: {e}")
+            return False
+
+        self._do_arquivo = False
+        if self._trocar(novo):
+            print(f"✅ Snapshot carregado: {novo.matriz.total_aliquotas} alíquotas, {len(novo.internas)} internas")
+            self.salvar_arquivo(dados)
+        return True
+
+    def salvar_arquivo(self, dados):
+        """Grava os dados carregados no arquivo local (escrita atômica)"""
+        if not self.arquivo:
+            return
+
+        try:
+            temporario = f"{self.arquivo}.{os.getpid()}.tmp"
+            with open(temporario, 'w', encoding='utf-8') as f:
+                json.dump(dados, f, ensure_ascii=False, default=str)
+            os.replace(temporario, self.arquivo)
+        except Exception as e:
+            print(f"⚠️ Não foi possível gravar o snapshot em '{self.arquivo}': {e}")
+
+    def carregar_arquivo(self):
+        """Aquece o snapshot a partir do arquivo local, sem acessar o banco"""
+        if not self.arquivo or not os.path.exists(self.arquivo):
+            return False
+
+        try:
+            with open(self.arquivo, 'r', encoding='utf-8') as f:
+                dados = json.load(f)
+            novo = DadosAliquotas(
+                dados['interestaduais'],
+                dados['internas'],
+                dados.get('ultima_atualizacao'),
+                dados.get('estados')
+            )
+        except Exception as e:
+            print(f"⚠️ Snapshot local '{self.arquivo}' ignorado: {e}")
+            return False
+
+        self._trocar(novo)
+        self._do_arquivo = True
+        print(f"📂 Snapshot aquecido do arquivo local: {novo.matriz.total_aliquotas} alíquotas")
+        return True
+
+    def _recarregar_em_segundo_plano(self):
+        """Recarrega sem bloquear a requisição que detectou o vencimento"""
+        try:
+            self.carregar()
+        finally:
+            self._atualizando = False
+
+    def atual(self):
+        """Retorna a versão atual, disparando recarga se estiver vencida"""
+        agora = time.monotonic()
+        pode_tentar = agora - self._ultima_tentativa >= self.INTERVALO_NOVA_TENTATIVA
+
+        if not self._carregado:
+            # Sem dados ainda: carrega de forma síncrona, com limite de tentativas
+            if pode_tentar:
+                with self._lock:
+                    if not self._carregado:
+                        self.carregar()
+            return self._dados
+
+        dados = self._dados
+        vencido = self.intervalo > 0 and agora - dados.carregado_monotonic > self.intervalo
+
+        # Dados vindos do arquivo local são substituídos assim que o banco responder
+        if (vencido or self._do_arquivo) and pode_tentar:
+            with self._lock:
+                if not self._atualizando:
+                    self._atualizando = True
+                    threading.Thread(target=self._recarregar_em_segundo_plano, daemon=True).start()
+
+        return dados
+
+    def consultar_aliquota(self, uf_origem, uf_destino):
+        """Consulta alíquota entre dois estados"""
+        return self.atual().consultar_aliquota(uf_origem.upper(), uf_destino.upper())
+
+    def listar_aliquotas_internas(self):
+        """Lista todas as alíquotas internas ativas"""
+        return self.atual().internas
+
+    def obter_matriz_completa(self):
+        """Retorna a matriz completa de alíquotas ({origem: {destino: aliquota}})"""
+        return self.atual().matriz.para_dicionario()
+
+    def listar_estados(self):
+        """Lista todos os estados cadastrados"""
+        return self.atual().lista_estados
+
+    def obter_estado(self, uf):
+        """Retorna um estado (com alíquota interna) ou None"""
+        return self.atual().estados.get(uf.upper())
+
+    def ufs_validas(self):
+        """Conjunto de UFs válidas na versão atual"""
+        return self.atual().ufs
+
+    def obter_estatisticas(self):
+        """Retorna as estatísticas da última importação"""
+        return self.atual().estatisticas
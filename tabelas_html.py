@@ -0,0 +1,132 @@
+"""
+Leitura de tabelas de alíquotas a partir do HTML da página
+
+O HTML é lido uma única vez com html.parser (biblioteca padrão), sem
+chamadas ao WebDriver por célula.
+"""
+from html.parser import HTMLParser
+
+
+class _ParserTabelas(HTMLParser):
+    """Coleta as tabelas do documento como listas de linhas de células (tag, texto)"""
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.tabelas = []
+        self._pilha = []
+        self._linha = None
+        self._celula = None
+
+    def handle_starttag(self, tag, attrs):
+        if tag == 'table':
+            tabela = []
+            self.tabelas.append(tabela)
+            self._pilha.append((tabela, self._linha, self._celula))
+            self._linha = None
+            self._celula = None
+        elif not self._pilha:
+            return
+        elif tag == 'tr':
+            self._fechar_linha()
+            self._linha = []
+        elif tag in ('td', 'th'):
+            self._fechar_celula()
+            if self._linha is None:
+                self._linha = []
+            self._celula = (tag, [])
+        elif tag == 'br' and self._celula is not None:
+            self._celula[1].append(' ')
+
+    def handle_endtag(self, tag):
+        if not self._pilha:
+            return
+        if tag == 'table':
+            self._fechar_linha()
+            _, self._linha, self._celula = self._pilha.pop()
+        elif tag == 'tr':
+            self._fechar_linha()
+        elif tag in ('td', 'th'):
+            self._fechar_celula()
+
+    def handle_data(self, data):
+        if self._celula is not None:
+            self._celula[1].append(data)
+
+    def _fechar_celula(self):
+        if self._celula is not None and self._linha is not None:
+            tag, partes = self._celula
+            # Normaliza espaços como o texto renderizado do navegador
+            self._linha.append((tag, ' '.join(''.join(partes).split())))
+        self._celula = None
+
+    def _fechar_linha(self):
+        self._fechar_celula()
+        if self._linha is not None and self._pilha:
+            self._pilha[-1][0].append(self._linha)
+        self._linha = None
+
+
+def extrair_tabelas(html):
+    """Retorna as tabelas do HTML, na ordem do documento, como listas de linhas"""
+    parser = _ParserTabelas()
+    parser.feed(html)
+    parser.close()
+    return parser.tabelas
+
+
+def converter_aliquota(texto):
+    """Converte '12%' / '12,5' em float; retorna None se não for numérico"""
+    try:
+        return float(texto.replace('%', '').replace(',', '.').strip())
+    except ValueError:
+        return None
+
+
+def ler_matriz_aliquotas(tabela, ufs_validas):
+    """
+    Lê uma tabela origem x destino
+
+    A primeira linha é o cabeçalho com as UFs de destino (a primeira
+    célula é ignorada); as demais começam pela UF de origem. Retorna
+    (matriz, aliquotas_internas, total_destinos). Células não numéricas
+    ficam como texto.
+    """
+    if len(tabela) == 0:
+        raise Exception("Nenhuma linha encontrada na tabela")
+
+    # Cabeçalho em <td>; se não houver, usa <th>
+    cabecalho = [texto for tag, texto in tabela[0] if tag == 'td']
+    if len(cabecalho) == 0:
+        cabecalho = [texto for tag, texto in tabela[0] if tag == 'th']
+    ufs_destino = cabecalho[1:]
+
+    matriz = {}
+    aliquotas_internas = {}
+
+    for linha in tabela[1:]:
+        celulas = [texto for tag, texto in linha if tag == 'td']
+
+        if len(celulas) < 2:
+            continue
+
+        uf_origem = celulas[0]
+        if uf_origem not in ufs_validas:
+            continue
+
+        matriz[uf_origem] = {}
+
+        for uf_destino, aliquota_texto in zip(ufs_destino, celulas[1:]):
+            aliquota = converter_aliquota(aliquota_texto)
+
+            if aliquota is None:
+                # Se não conseguir converter, mantém como texto
+                matriz[uf_origem][uf_destino] = aliquota_texto
+                continue
+
+            # Armazena alíquota interna (origem = destino)
+            if uf_origem == uf_destino:
+                aliquotas_internas[uf_origem] = aliquota
+
+            matriz[uf_origem][uf_destino] = aliquota
+
+    return matriz, aliquotas_internas, len(ufs_destino)
@@ -0,0 +1,86 @@
+"""
+Pipeline de atualização com scraper e banco simulados
+"""
+import pytest
+import icms_scraper
+from atualizacao import GerenciadorAtualizacao
+
+
+class ScraperFalso:
+    instancias = []
+
+    def __init__(self, *args, **kwargs):
+        self.sem_alteracao = False
+        self.erros = []
+        self.validadores_confirmados = False
+        ScraperFalso.instancias.append(self)
+
+    def scrape(self):
+        return {'SP': {'RJ': 12.0}}
+
+    def get_dados_completos(self):
+        return {'matriz_interestadual': self.scrape(), 'aliquotas_internas': {}, 'metadata': {}}
+
+    def confirmar_validadores(self):
+        self.validadores_confirmados = True
+
+    def fechar(self):
+        pass
+
+
+class BancoFalso:
+    def __init__(self, erros):
+        self.erros = erros
+
+    def importar_dados(self, dados):
+        return {
+            'sucesso': True,
+            'total_registros': 1,
+            'total_internas': 0,
+            'total_interestaduais': 1,
+            'total_removidas': 0,
+            'alteracoes': None,
+            'erros': self.erros
+        }
+
+
+class SnapshotFalso:
+    def carregar(self):
+        return True
+
+
+def executar(tmp_path, erros):
+    gerenciador = GerenciadorAtualizacao(lambda: BancoFalso(erros), SnapshotFalso(), diretorio=str(tmp_path))
+    job = {'id': 'ab' * 16, 'status': 'executando', 'fase': 'na_fila', 'fases': {}, 'resultado': None, 'erro': None}
+    gerenciador._executar(job, gerenciador._tentar_lock())
+    return job, ScraperFalso.instancias[-1]
+
+
+@pytest.fixture(autouse=True)
+def scraper_falso(monkeypatch):
+    monkeypatch.setattr(icms_scraper, 'ICMS_Scraper', ScraperFalso)
+
+
+def test_importacao_completa_grava_validadores(tmp_path):
+    job, scraper = executar(tmp_path, erros=[])
+
+    assert job['status'] == 'concluido'
+    assert scraper.validadores_confirmados
+
+
+def test_importacao_parcial_nao_grava_validadores(tmp_path):
+    job, scraper = executar(tmp_path, erros=['Erro no lote 3: timeout'])
+
+    assert job['status'] == 'concluido'
+    assert job['resultado']['erros'] == ['Erro no lote 3: timeout']
+    assert not scraper.validadores_confirmados
+
+
+def test_falha_ao_abrir_o_lock_libera_o_lock_local(tmp_path):
+    gerenciador = GerenciadorAtualizacao(lambda: None, SnapshotFalso(), diretorio=str(tmp_path))
+    gerenciador.arquivo_lock = str(tmp_path / 'inexistente' / 'atualizacao.lock')
+
+    with pytest.raises(OSError):
+        gerenciador._tentar_lock()
+
+    assert gerenciador._lock_local.acquire(blocking=False)
@@ -0,0 +1,82 @@
+"""
+SupabaseDB.calcular_alteracoes com as alíquotas ativas simuladas
+"""
+import pytest
+from database import SupabaseDB
+from matriz_aliquotas import MatrizAliquotas
+from ufs import UFS
+
+
+def matriz_completa(valor=12.0, exceto=()):
+    return {
+        origem: {destino: valor for destino in UFS if (origem, destino) not in exceto}
+        for origem in UFS
+    }
+
+
+@pytest.fixture
+def banco():
+    db = SupabaseDB.__new__(SupabaseDB)
+    db.ativas = MatrizAliquotas.de_dicionario(matriz_completa(), {'SP': 18.0})
+    db.obter_aliquotas_ativas = lambda: db.ativas
+    return db
+
+
+def pares(alteracoes, tipo):
+    return {(item['origem'], item['destino']) for item in alteracoes['interestaduais'][tipo]}
+
+
+def test_sem_mudancas(banco):
+    alteracoes = banco.calcular_alteracoes(matriz_completa(), {'SP': 18.0})
+
+    assert alteracoes['interestaduais'] == {'inseridas': [], 'alteradas': [], 'removidas': []}
+    assert alteracoes['internas'] == {'inseridas': [], 'alteradas': []}
+    assert alteracoes['erros'] == []
+
+
+def test_insercao_e_alteracao(banco):
+    banco.ativas = MatrizAliquotas.de_dicionario(matriz_completa(exceto={('SP', 'RJ')}), {'SP': 18.0})
+    matriz = matriz_completa()
+    matriz['SP']['BA'] = 7.0
+
+    alteracoes = banco.calcular_alteracoes(matriz, {'SP': 19.0, 'RJ': 22.0})
+
+    assert pares(alteracoes, 'inseridas') == {('SP', 'RJ')}
+    assert alteracoes['interestaduais']['alteradas'] == [
+        {'origem': 'SP', 'destino': 'BA', 'aliquota_anterior': 12.0, 'aliquota': 7.0}
+    ]
+    assert alteracoes['internas']['inseridas'] == [{'uf': 'RJ', 'aliquota': 22.0}]
+    assert alteracoes['internas']['alteradas'] == [{'uf': 'SP', 'aliquota_anterior': 18.0, 'aliquota': 19.0}]
+
+
+def test_remocao_de_par_extraido(banco):
+    alteracoes = banco.calcular_alteracoes(matriz_completa(exceto={('SP', 'RJ')}), {})
+
+    assert pares(alteracoes, 'removidas') == {('SP', 'RJ')}
+
+
+def test_linha_de_origem_ausente_nao_remove(banco):
+    matriz = matriz_completa()
+    del matriz['TO']
+
+    alteracoes = banco.calcular_alteracoes(matriz, {})
+
+    assert alteracoes['interestaduais']['removidas'] == []
+
+
+def test_coluna_de_destino_ausente_nao_remove(banco):
+    matriz = matriz_completa(exceto={(origem, 'TO') for origem in UFS})
+
+    alteracoes = banco.calcular_alteracoes(matriz, {})
+
+    assert alteracoes['interestaduais']['removidas'] == []
+
+
+def test_celula_invalida_nao_remove(banco):
+    matriz = matriz_completa()
+    matriz['SP']['RJ'] = '-'
+
+    alteracoes = banco.calcular_alteracoes(matriz, {})
+
+    assert alteracoes['interestaduais']['removidas'] == []
+    assert alteracoes['erros'] == ["Alíquota inválida SP → RJ: '-'"]
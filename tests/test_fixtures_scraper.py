@@ -0,0 +1,49 @@
+"""
+Extração completa a partir das fixtures HTML de fixtures/, sem rede nem navegador
+"""
+import os
+import pytest
+import benchmark_parser
+from config import Config
+from icms_scraper import ICMS_Scraper
+from ufs import UFS
+
+DIRETORIO_FIXTURES = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'fixtures')
+TOTAL_UFS = len(UFS)
+
+
+@pytest.fixture
+def scraper(monkeypatch):
+    monkeypatch.setattr(Config, 'SCRAPING_FIXTURES_MODO', 'reproduzir')
+    monkeypatch.setattr(Config, 'SCRAPING_FIXTURES_DIR', DIRETORIO_FIXTURES)
+    scraper = ICMS_Scraper()
+    yield scraper
+    scraper.fechar()
+
+
+def test_reproducao_gera_matriz_completa(scraper):
+    matriz = scraper.scrape()
+
+    assert matriz is not None
+    assert scraper.erros == []
+    assert scraper.fonte_utilizada == list(ICMS_Scraper.FONTES)
+    assert scraper.matriz_aliquotas.total_estados == TOTAL_UFS
+    assert scraper.matriz_aliquotas.total_aliquotas == TOTAL_UFS * TOTAL_UFS
+    assert scraper.matriz_aliquotas.total_internas == TOTAL_UFS
+    assert sorted(scraper.aliquotas_internas) == sorted(UFS)
+    assert scraper.matriz_aliquotas.aliquota('SP', 'BA') == 7.0
+    assert scraper.matriz_aliquotas.aliquota('BA', 'SP') == 12.0
+    assert scraper.matriz_aliquotas.aliquota_interna('PR') == 19.5
+
+
+@pytest.mark.parametrize('fonte', list(ICMS_Scraper.FONTES))
+def test_fixture_de_cada_fonte_completa(fonte):
+    resultado = benchmark_parser.medir_fonte(os.path.join(DIRETORIO_FIXTURES, f"{fonte}.html"), repeticoes=1)
+
+    assert resultado['estados'] == TOTAL_UFS
+    assert resultado['aliquotas'] == TOTAL_UFS * TOTAL_UFS
+    assert resultado['aliquotas_internas'] == TOTAL_UFS
+
+
+def test_benchmark_roda_sobre_as_fixtures():
+    assert benchmark_parser.main(['--dir', DIRETORIO_FIXTURES, '--repeticoes', '3']) == 0
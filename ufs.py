@@ -0,0 +1,6 @@
+# Siglas das 27 unidades federativas, na ordem usada como índice nas matrizes
+UFS = ('AC', 'AL', 'AM', 'AP', 'BA', 'CE', 'DF', 'ES', 'GO', 'MA',
+       'MT', 'MS', 'MG', 'PA', 'PB', 'PR', 'PE', 'PI', 'RN', 'RS',
+       'RJ', 'RO', 'RR', 'SC', 'SP', 'SE', 'TO')
+
+INDICE_UF = {uf: indice for indice, uf in enumerate(UFS)}